@@ -0,0 +1,53 @@
+"""
+Cold and warm render time of the app pages (one per station), headless
+through Streamlit's `AppTest`. Cold is the first run in a fresh process
+(empty caches); warm repeats it with the caches filled.
+
+    python -m benchmarks.bench_app
+"""
+import os
+import time
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'streamlit_app.py')
+
+
+def _page_seconds(app, station=None):
+    start = time.perf_counter()
+    if station is None:
+        app.run(timeout=120)
+    else:
+        # The station selector sits in the input form: choose, then submit
+        app.selectbox[0].set_value(station)
+        next(b for b in app.button if b.label.startswith("✅")).click().run(timeout=120)
+    seconds = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(f"App failed on {station!r}: {app.exception[0].message}")
+    return seconds
+
+
+def collect(quick=False):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("streamlit is not installed: skipping the app benchmarks.")
+        return
+
+    # The app reads data/ relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(APP_FILE))
+    try:
+        app = AppTest.from_file(APP_FILE)
+        yield dict(name='app_page', params={'station': 1, 'cache': 'cold'}, value=_page_seconds(app), unit='s')
+        yield dict(name='app_page', params={'station': 1, 'cache': 'warm'}, value=_page_seconds(app), unit='s')
+        stations = app.selectbox[0].options
+        for number, station in enumerate(stations[1:2] if quick else stations[1:], start=2):
+            for cache in ('cold', 'warm'):
+                yield dict(name='app_page', params={'station': number, 'cache': cache},
+                           value=_page_seconds(app, station), unit='s')
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    for record in collect():
+        print(f"{record['name']:>10} {str(record['params']):>36} {record['value']:>8.3f} {record['unit']}")
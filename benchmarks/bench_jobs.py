@@ -0,0 +1,45 @@
+"""
+Throughput of the live station runs under a classroom burst: many sessions
+asking at once for a few distinct slider positions. 'direct' runs every
+request on its own session thread (each one a separate simulation, as with
+a plain per-session call); 'queue' goes through the shared `JobQueue`.
+
+    python -m benchmarks.bench_jobs
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.jobs import JobQueue
+from pipeline.vegetation import run_vegetation
+
+
+def burst_seconds(request, values, sessions):
+    """Wall time until `sessions` concurrent threads each got `request(value)`, cycling through `values`."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(sessions) as pool:
+        list(pool.map(request, [values[i % len(values)] for i in range(sessions)]))
+    return time.perf_counter() - start
+
+
+def collect(quick=False):
+    sessions = 10 if quick else 30
+    values = [0.3, 0.5, 0.8, 1.0, 1.5, 2.0][:3 if quick else 6]
+    params = {'sessions': sessions, 'distinct': len(values)}
+
+    seconds = burst_seconds(lambda rainfall: run_vegetation(rainfall, n_frames=1), values, sessions)
+    yield dict(name='burst', params={**params, 'mode': 'direct'}, value=sessions / seconds, unit='requests/s')
+
+    queue = JobQueue()
+    try:
+        # Start the workers first, as on a running server
+        queue.submit(run_vegetation, 1.0, t_end=1.0, n_frames=1).result()
+        seconds = burst_seconds(lambda rainfall: queue.submit(run_vegetation, rainfall, n_frames=1).result(),
+                                values, sessions)
+        yield dict(name='burst', params={**params, 'mode': 'queue'}, value=sessions / seconds, unit='requests/s')
+    finally:
+        queue.shutdown()
+
+
+if __name__ == '__main__':
+    for record in collect():
+        print(f"{record['name']:>10} {str(record['params']):>56} {record['value']:>8.2f} {record['unit']}")
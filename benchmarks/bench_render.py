@@ -0,0 +1,73 @@
+"""
+Time per rendered and encoded animation frame, for the figure (blitted
+matplotlib) and heatmap (colormap lookup) paths and the 3D city surface.
+
+    python -m benchmarks.bench_render
+"""
+import os
+import tempfile
+import time
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+
+from pipeline.burgers_city_simulation_v2 import city_surface_renderer
+from pipeline.obstacle_simulation_v2 import heatmap_scale, make_triple_solver, triple_panel_figure, u_flow_speed
+from pipeline.render import HeatmapRenderer
+from pipeline.streaming import FigureStream, GifStreamWriter
+
+
+def ms_per_frame(grab, n_frames):
+    grab()  # warm-up (first draw, palette setup)
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        grab()
+    return (time.perf_counter() - start) / n_frames * 1e3
+
+
+def collect(quick=False):
+    n_frames = 5 if quick else 20
+    solver = make_triple_solver(['circle'])
+    solver.run(50)
+    magnitude = solver.magnitude
+    members = range(3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fig, imgs = triple_panel_figure(solver.grid, solver.mask, 'circle', members)
+        with FigureStream(fig, os.path.join(tmp, 'figure.gif'), fps=15, artists=imgs) as stream:
+            def grab():
+                for img, m in zip(imgs, members):
+                    img.set_data(magnitude[m])
+                stream.grab()
+            yield dict(name='render_triple_figure', params={}, value=ms_per_frame(grab, n_frames), unit='ms/frame')
+        plt.close(fig)
+
+        heatmap = HeatmapRenderer('Blues_r', 0, u_flow_speed * 1.5, scale=heatmap_scale(solver.grid))
+        with GifStreamWriter(os.path.join(tmp, 'heatmap.gif'), fps=15) as writer:
+            yield dict(name='render_triple_heatmap', params={},
+                       value=ms_per_frame(lambda: writer.write(heatmap.image(*magnitude)), n_frames), unit='ms/frame')
+
+        # Pure GIF encoding of an already rendered frame
+        image = heatmap.image(*magnitude)
+        with GifStreamWriter(os.path.join(tmp, 'encode.gif'), fps=15) as writer:
+            yield dict(name='gif_encode', params={'size': list(image.size)},
+                       value=ms_per_frame(lambda: writer.write(image), n_frames), unit='ms/frame')
+
+        x, y = np.linspace(0, 15, 30), np.linspace(0, 158, 316)
+        X, Y = np.meshgrid(x, y)
+        Z = 0.5 * np.exp(-((Y - 60) / 20) ** 2)
+        fig = plt.figure(figsize=(14, 10))
+        ax = fig.add_subplot(111, projection='3d')
+        update = city_surface_renderer(ax, X, Y, 0.85, 15.0, 158.0, 100.0, 15.0, 8.0, 0.5)
+        with FigureStream(fig, os.path.join(tmp, 'city.gif'), fps=20) as stream:
+            yield dict(name='render_city_surface', params={},
+                       value=ms_per_frame(lambda: stream.grab(update(Z, 1.0)), max(2, n_frames // 4)),
+                       unit='ms/frame')
+        plt.close(fig)
+
+
+if __name__ == '__main__':
+    matplotlib.use('Agg')
+    for record in collect():
+        print(f"{record['name']:>24} {record['value']:>10.1f} {record['unit']}")
@@ -0,0 +1,102 @@
+"""
+Solver throughput vs grid size (1D and 2D) and time / peak memory of the
+full station runs.
+
+    python -m benchmarks.bench_solver
+"""
+import time
+import tracemalloc
+
+from benchmarks.bench_stencil import make_solver, steps_per_second
+from pipeline.burgers_city_simulation import make_river_solver, run_river
+from pipeline.burgers_city_simulation_v2 import make_city_solver
+from pipeline.obstacle_simulation_v2 import make_triple_solver
+from pipeline.solver import KERNELS, SteadyState
+from pipeline.vegetation import run_vegetation
+
+
+def timed_peak(fn):
+    """`(seconds, peak traced bytes)` of `fn()`, from two calls: tracing slows the timed one down."""
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def run_city(hours, active_tiles, distance=100.0, dx=0.5, state=None):
+    """
+    Adaptive steps of the 2D city flood with the defaults of
+    `simulate_2d_burgers_with_city_surface_plot`, from the checkpoint `state` when given.
+    """
+    nx, ny = int(15.0 / dx), int((distance + 8.0 + distance / 2) / dx)
+    solver = make_city_solver(nx, ny, dx, dx, 0.04, 1.2, 1.5, 0.5, 24.0 * 60, active_tiles=active_tiles)
+    if state is not None:
+        solver.restore(state)
+    solver.run_until([hours], dt_max=0.2)
+    return solver
+
+
+def collect(quick=False):
+    steps = 200 if quick else 1000
+    for nx in (200, 1000) if quick else (200, 1000, 5000):
+        solver = make_river_solver(nx, 0.1, 0.01, 0.1, 0.3, 0.8, 0.01)
+        yield dict(name='solver_1d', params={'nx': nx}, value=steps_per_second(solver, steps), unit='steps/s')
+
+    steps = 20 if quick else 100
+    for n in (100, 256) if quick else (100, 256, 512):
+        for kernel in KERNELS:
+            yield dict(name='solver_2d', params={'n': n, 'kernel': kernel},
+                       value=steps_per_second(make_solver(n, kernel), steps), unit='steps/s')
+
+    # The 10,000-step loop of simulate_burgers_with_city, without drawing
+    seconds, peak = timed_peak(lambda: run_river(20))
+    yield dict(name='river_run', params={'distance': 20}, value=seconds, unit='s')
+    yield dict(name='river_run_peak_memory', params={'distance': 20}, value=peak, unit='bytes')
+
+    # The first simulated hours of burgers_city_simulation_v2, with and without skipping the river at rest
+    hours = 50 if quick else 300
+    for active_tiles in (None, 8):
+        start = time.perf_counter()
+        run_city(hours, active_tiles)
+        seconds = time.perf_counter() - start
+        yield dict(name='city_run', params={'hours': hours, 'active_tiles': active_tiles}, value=seconds, unit='s')
+
+    # The same run restarted from a checkpoint half-way: only the second half is stepped
+    state = run_city(hours / 2, 8).checkpoint()
+    start = time.perf_counter()
+    run_city(hours, 8, state=state)
+    seconds = time.perf_counter() - start
+    yield dict(name='city_run_restarted', params={'hours': hours, 'from_hours': hours / 2}, value=seconds, unit='s')
+
+    # One live station 4 run (rainfall slider)
+    seconds, peak = timed_peak(lambda: run_vegetation(0.5, n_frames=1))
+    yield dict(name='vegetation_run', params={'rainfall': 0.5}, value=seconds, unit='s')
+    yield dict(name='vegetation_run_peak_memory', params={'rainfall': 0.5}, value=peak, unit='bytes')
+
+    # The 500-step batched loop of obstacle_simulation_v2, without drawing
+    n_steps = 100 if quick else 500
+    seconds, peak = timed_peak(lambda: make_triple_solver(['circle']).run(n_steps))
+    yield dict(name='triple_run', params={'steps': n_steps}, value=seconds, unit='s')
+    yield dict(name='triple_run_peak_memory', params={'steps': n_steps}, value=peak, unit='bytes')
+
+    # The same loop run until the wakes settle (at most T=30), with and without stopping there
+    if not quick:
+        for steady_tol in (None, 1e-3):
+            solver = make_triple_solver(['circle'])
+            steady = None if steady_tol is None else SteadyState(steady_tol)
+            start = time.perf_counter()
+            for _ in solver.iter_steps(3000, 10, steady=steady):
+                pass
+            seconds = time.perf_counter() - start
+            params = {'steady_tol': steady_tol}
+            yield dict(name='triple_until_steady', params=params, value=seconds, unit='s')
+            yield dict(name='triple_until_steady_steps', params=params, value=solver.n_steps, unit='steps')
+
+
+if __name__ == '__main__':
+    for record in collect():
+        print(f"{record['name']:>24} {str(record['params']):>32} {record['value']:>14.4g} {record['unit']}")
@@ -0,0 +1,66 @@
+"""
+Throughput and temporary memory of the 2D Burgers stencil kernels.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_stencil
+    python -m benchmarks.bench_stencil --sizes 100 512 --steps 200
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from pipeline.solver import KERNELS, Burgers2D, Grid2D, Neumann
+
+
+def make_solver(n, kernel):
+    grid = Grid2D.from_lengths(4.0, 10.0, n, n)
+    nu = 0.05
+    # Stable explicit step for the finest spacing (diffusion and advection limits)
+    h = min(grid.dx, grid.dy)
+    dt = 0.5 * min(h ** 2 / (4 * nu), h / 1.5)
+    mask = np.zeros(grid.shape, dtype=bool)
+    mask[n // 2 - n // 10: n // 2 + n // 10, n // 2 - n // 10: n // 2 + n // 10] = True
+    return Burgers2D(grid, nu, dt, bcs=[Neumann('left'), Neumann('right')], mask=mask,
+                     u0=0.0, v0=1.0, kernel=kernel)
+
+
+def steps_per_second(solver, n_steps):
+    solver.run(5)  # warm-up
+    start = time.perf_counter()
+    solver.run(n_steps)
+    return n_steps / (time.perf_counter() - start)
+
+
+def peak_temporary_bytes(solver, n_steps=10):
+    """Peak memory allocated on top of the solver state while stepping."""
+    solver.run(2)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    solver.run(n_steps)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 256, 512])
+    parser.add_argument('--steps', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'grid':>9} {'kernel':>7} {'steps/s':>10} {'temp KiB':>10} {'speedup':>8}")
+    for n in args.sizes:
+        baseline = None
+        for name in KERNELS:
+            rate = steps_per_second(make_solver(n, name), args.steps)
+            temp = peak_temporary_bytes(make_solver(n, name))
+            baseline = baseline or rate
+            print(f"{n:>4}x{n:<4} {name:>7} {rate:>10.1f} {temp / 1024:>10.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Run all benchmarks and store the results as JSON, one file per commit, so
+regressions show up between commits.
+
+    python -m benchmarks.suite                      # -> benchmarks/results/<commit>.json
+    python -m benchmarks.suite --quick --only solver
+    python -m benchmarks.suite --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+Every record is `{name, params, value, unit}`; rates (`.../s`) are better
+when higher, times and memory when lower.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import time
+
+import matplotlib
+import numpy as np
+
+SUITES = ('solver', 'render', 'jobs', 'app')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'commit': _git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(suites=SUITES, quick=False):
+    matplotlib.use('Agg')
+    records = []
+    for suite in suites:
+        module = importlib.import_module(f'benchmarks.bench_{suite}')
+        for record in module.collect(quick):
+            print(f"{record['name']:>24} {_params(record):>36} {record['value']:>12.4g} {record['unit']}")
+            records.append(record)
+    return {'environment': environment(), 'quick': quick, 'results': records}
+
+
+def _params(record):
+    return ','.join(f'{k}={v}' for k, v in sorted(record['params'].items()))
+
+
+def _key(record):
+    return record['name'], _params(record)
+
+
+def higher_is_better(unit):
+    return unit.endswith('/s')
+
+
+def compare(old, new, tolerance=0.1):
+    """
+    Print new vs old for every benchmark in both files and return the
+    regressions (worse by more than `tolerance`, relative).
+    """
+    before = {_key(r): r for r in old['results']}
+    regressions = []
+    print(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+    for record in new['results']:
+        previous = before.get(_key(record))
+        if previous is None or not previous['value']:
+            continue
+        ratio = record['value'] / previous['value']
+        change = ratio - 1 if higher_is_better(record['unit']) else 1 / ratio - 1
+        flag = ''
+        if change < -tolerance:
+            flag = '  REGRESSION'
+            regressions.append(record)
+        elif change > tolerance:
+            flag = '  faster' if record['unit'] != 'bytes' else '  smaller'
+        print(f"{record['name']:>24} {_params(record):>36} {previous['value']:>12.4g} -> {record['value']:<12.4g}"
+              f" {record['unit']:>9} {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=SUITES, default=SUITES)
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes and fewer repetitions")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files and exit")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as fp_old, open(args.compare[1]) as fp_new:
+            regressions = compare(json.load(fp_old), json.load(fp_new), args.tolerance)
+        raise SystemExit(1 if regressions else 0)
+
+    results = run(args.only, args.quick)
+    output = args.output
+    if output is None:
+        env = results['environment']
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{env['commit'] or 'local'}{'-dirty' if env['dirty'] else ''}.json")
+    with open(output, 'w') as fp:
+        json.dump(results, fp, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""
+Simulation pipeline for the FlowApp stations.
+
+Scripts are run as modules from the repository root, e.g.
+``python -m pipeline.obstacle_simulation_v2 --obstacle circle``.
+"""
+from pipeline.cache import ResultCache, solver_version
+from pipeline.checkpoints import Checkpoint, StateLibrary, load_checkpoint, save_checkpoint
+from pipeline.geometry import Circle, MaskIndices, Pier, Polygon, Rectangle, Triangle, Weir, coverage, rasterize
+from pipeline.jobs import Job, JobQueue, job_key
+from pipeline.nested import NestedBurgers2D, Patch, patch_around
+from pipeline.obstacles import (OBSTACLE_TYPES, create_obstacle_mask, layout_indices, stacked_layout_masks,
+                                station_obstacle, triple_layout_masks, triple_layout_shapes)
+from pipeline.solver import (INTEGRATORS, KERNELS, Burgers1D, Burgers2D, Dirichlet, Grid2D, Neumann,
+                             PaddedOutflow, SteadyState, apply_boundary_conditions, burgers_rhs, default_kernel)
+from pipeline.streaming import FigureStream, GifStreamWriter
+from pipeline.results import ResultWriter, SimulationResult, load_result
+from pipeline.render import HeatmapRenderer, colormap_lut
+from pipeline.profiling import Profiler, count, phase, profiled, profiler
+from pipeline.vegetation import VegetationRun, WaterVegetation2D, river_band, run_vegetation
@@ -1,6 +1,268 @@
+import argparse
+from collections import namedtuple
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+
+from pipeline.cache import CACHE_DIR, ResultCache
+from pipeline.profiling import phase, profiled
+from pipeline.solver import INTEGRATORS, Burgers1D, Dirichlet, Neumann, PaddedOutflow
+from pipeline.streaming import FigureStream
+
+
+def make_river_solver(nx, dx, dt, nu, source_amplitude, source_frequency, initial_baseline, integrator='explicit'):
+    """
+    1D river starting at rest (baseline level) with a rectified sinusoidal
+    source on the left end and free outflow on the right.
+    """
+    def source(t):
+        return source_amplitude * abs(np.sin(2 * np.pi * source_frequency * t)) + initial_baseline
+
+    bcs = [
+        # Boundary condition: sinusoidal inflow on the left
+        Dirichlet('left', u=source),
+        # Right boundary: free outflow (Neumann-like)
+        Neumann('right', fields='u'),
+    ]
+    return Burgers1D(nx, dx, nu, dt, bcs=bcs, u0=initial_baseline, integrator=integrator)
+
+
+def river_domain(d_distance_to_city, city_width, dx, dt, source_amplitude, simulation_time_factor):
+    """
+    Domain length, grid size and number of steps for a city `d_distance_to_city`
+    km downstream: long enough for the wave to reach and pass the city.
+    Returns `(L, nx, nt, total_sim_time)`.
+    """
+    # Domain length needs to accommodate the city and some space beyond it
+    # Let's set it to d_distance_to_city + city_width + some buffer (e.g., d_distance_to_city / 2 or a fixed value)
+    L = d_distance_to_city + city_width + d_distance_to_city / 2
+    if L < city_width + 10:  # Ensure minimum length for visualization
+        L = city_width + 10
+    nx = int(L / dx) + 1
+
+    # Estimate simulation time needed for the wave to reach and pass the city
+    # This is trickier with a continuous source, let's set a reasonable simulation time
+    # based on some wave propagation speed assumption and domain length.
+    # Assuming a characteristic speed related to the source amplitude or a default value.
+    char_speed = max(source_amplitude, 0.1)
+    estimated_travel_time_to_city_end = (d_distance_to_city + city_width) / char_speed
+    total_sim_time = estimated_travel_time_to_city_end * simulation_time_factor
+    nt = int(total_sim_time / dt)
+
+    nt = min(nt, 10000)  # Cap timesteps to avoid overly long runs, adjust as needed
+    return L, nx, nt, total_sim_time
+
+
+RiverRun = namedtuple('RiverRun', 'x times frames city_volume city')
+#: frames (about) of the river animation
+ANIMATION_FRAMES = 200
+
+
+def run_river(
+        d_distance_to_city,
+        city_width=8.0,
+        dx=0.1,
+        dt=0.01,
+        nu=0.1,
+        source_amplitude=0.3,
+        source_frequency=0.8,
+        initial_baseline=0.01,
+        simulation_time_factor=1.5,
+        integrator='explicit',
+        n_frames=200,
+        progress=None,
+):
+    """
+    Headless version of `simulate_burgers_with_city`: the same run, without
+    plotting or prompts, returned as arrays for the caller to draw.
+    `progress(fraction)` is called at every stored frame, if given.
+
+    Returns a `RiverRun` with the grid `x` (nx,), the frame `times` and
+    `frames` (n, nx) (about `n_frames` of them, including t=0), the
+    integrated height inside the city per frame and the city bounds
+    `(start, end)` in km.
+    """
+    L, nx, nt, _ = river_domain(d_distance_to_city, city_width, dx, dt, source_amplitude, simulation_time_factor)
+    x = np.linspace(0, L, nx)
+    solver = make_river_solver(nx, dx, dt, nu, source_amplitude, source_frequency, initial_baseline, integrator)
+    store_every = max(1, nt // n_frames)
+
+    # t=0, then every step `iter_steps` yields at
+    frames = np.empty((len(range(0, nt, store_every)) + 1, nx))
+    times = np.zeros(len(frames))
+    frames[0] = solver.u
+    for k, n in enumerate(solver.iter_steps(nt, store_every=store_every), start=1):
+        # `iter_steps` yields after steps 1, s + 1, 2s + 1, ... (n is the step index)
+        frames[k] = solver.u
+        times[k] = (n + 1) * dt
+        if progress is not None:
+            progress((n + 1) / nt)
+
+    city = (d_distance_to_city, d_distance_to_city + city_width)
+    in_city = (x >= city[0]) & (x <= city[1])
+    city_volume = frames[:, in_city].sum(axis=1) * dx
+    return RiverRun(x, times, frames, city_volume, city)
+
+
+FloodMetrics = namedtuple('FloodMetrics', 'arrival_time peak_time peak_volume max_city_height exceedance')
+
+
+class CityGauge:
+    """
+    Flood statistics at the city, accumulated while the solver runs: call
+    `update(t, u)` after every step (and once for the initial state). Only
+    the previous sample is kept, so memory does not grow with the run.
+
+    - arrival: first time the height at the city's left edge rises
+      `arrival_height` above `baseline` (interpolated within the step)
+    - peak: largest integrated height (volume) inside the city and its time
+    - exceedance: for every threshold in `volume_thresholds`, the total time
+      the city volume stays above it (crossings interpolated within the step)
+
+    For a batch of rivers (`u` of shape `(B, nx)`, see `flood_metrics_by_distance`)
+    pass one grid and one `(start, end)` city per row; rows stop counting
+    after their own `t_end`.
+    """
+
+    def __init__(self, x, city, dx, baseline, arrival_height=0.01, volume_thresholds=(), t_end=np.inf):
+        self.batched = np.ndim(city) == 2
+        grids, cities = (x, city) if self.batched else ([x], [city])
+        nx = max(len(g) for g in grids)
+        self._weights = np.zeros((len(grids), nx))
+        self._edge = np.empty(len(grids), dtype=int)
+        for row, (g, (start, end)) in enumerate(zip(grids, cities)):
+            inside = np.flatnonzero((g >= start) & (g <= end))
+            self._weights[row, inside] = dx
+            self._edge[row] = inside[0] if len(inside) else np.searchsorted(g, start)
+        self._rows = np.arange(len(grids))
+        self._inside = self._weights > 0
+        self.arrival_level = baseline + arrival_height
+        self.thresholds = np.asarray(volume_thresholds, dtype=float)
+        self.t_end = np.broadcast_to(np.asarray(t_end, dtype=float), (len(grids),))
+
+        n = len(grids)
+        self.arrival_time = np.full(n, np.nan)
+        self.peak_time = np.full(n, np.nan)
+        self.peak_volume = np.full(n, -np.inf)
+        self.max_city_height = np.full(n, -np.inf)
+        self.exceedance = np.zeros((n, len(self.thresholds)))
+        self._prev = None  # (t, edge heights, volumes)
+
+    def update(self, t, u):
+        u = np.reshape(u, (len(self._rows), -1))
+        active = t <= self.t_end + 1e-9
+        volume = np.einsum('bi,bi->b', u, self._weights)
+        edge = u[self._rows, self._edge]
+
+        new_peak = active & (volume > self.peak_volume)
+        self.peak_volume[new_peak] = volume[new_peak]
+        self.peak_time[new_peak] = t
+        city_max = np.where(self._inside, u, -np.inf).max(axis=1)
+        self.max_city_height[active] = np.maximum(self.max_city_height, city_max)[active]
+
+        waiting = active & np.isnan(self.arrival_time) & (edge >= self.arrival_level)
+        if self._prev is None:
+            self.arrival_time[waiting] = t
+        else:
+            t0, edge0, volume0 = self._prev
+            self.arrival_time[waiting] = t0 + (t - t0) * _crossing(edge0, edge, self.arrival_level)[waiting]
+            if len(self.thresholds):
+                level = self.thresholds[None, :]
+                above0, above = volume0[:, None] > level, volume[:, None] > level
+                fraction = _crossing(volume0[:, None], volume[:, None], level)
+                # full step above, or the part of a crossing step spent above
+                time_above = np.where(above0 & above, 1.0,
+                                      np.where(above, 1 - fraction, np.where(above0, fraction, 0.0)))
+                self.exceedance[active] += (t - t0) * time_above[active]
+        self._prev = (t, edge, volume)
+
+    def metrics(self):
+        """
+        `FloodMetrics` so far (a list of them for a batch); `arrival_time`
+        is None if the wave has not reached the city.
+        """
+        rows = [FloodMetrics(None if np.isnan(a) else float(a), float(tp), float(pv), float(mh), tuple(e.tolist()))
+                for a, tp, pv, mh, e in zip(self.arrival_time, self.peak_time, self.peak_volume,
+                                             self.max_city_height, self.exceedance)]
+        return rows if self.batched else rows[0]
+
+
+def _crossing(a, b, level):
+    """Fraction of the way from `a` to `b` at which the linear interpolant reaches `level`."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(b == a, 0.0, (level - a) / (b - a))
+    return np.clip(fraction, 0.0, 1.0)
+
+
+def flood_metrics(
+        d_distance_to_city,
+        city_width=8.0,
+        dx=0.1,
+        dt=0.01,
+        nu=0.1,
+        source_amplitude=0.3,
+        source_frequency=0.8,
+        initial_baseline=0.01,
+        simulation_time_factor=1.5,
+        integrator='explicit',
+        arrival_height=0.01,
+        volume_thresholds=(),
+):
+    """
+    "How much time do we have?" for one distance: the run of
+    `simulate_burgers_with_city` reduced on the fly to `FloodMetrics` by a
+    `CityGauge`, without storing frames or drawing. Times are in the model's
+    time unit (hours in the app), volumes in height x km.
+    """
+    L, nx, nt, _ = river_domain(d_distance_to_city, city_width, dx, dt, source_amplitude, simulation_time_factor)
+    x = np.linspace(0, L, nx)
+    solver = make_river_solver(nx, dx, dt, nu, source_amplitude, source_frequency, initial_baseline, integrator)
+    gauge = CityGauge(x, (d_distance_to_city, d_distance_to_city + city_width), dx, initial_baseline,
+                      arrival_height, volume_thresholds)
+    gauge.update(solver.t, solver.u)
+    for _ in solver.iter_steps(nt):
+        gauge.update(solver.t, solver.u)
+    return gauge.metrics()
+
+
+def flood_metrics_by_distance(
+        distances,
+        city_width=8.0,
+        dx=0.1,
+        dt=0.01,
+        nu=0.1,
+        source_amplitude=0.3,
+        source_frequency=0.8,
+        initial_baseline=0.01,
+        simulation_time_factor=1.5,
+        integrator='explicit',
+        arrival_height=0.01,
+        volume_thresholds=(),
+):
+    """
+    `flood_metrics` for many distances in a single run: every river is one
+    row of a `(len(distances), nx)` array on the grid of the longest one,
+    with its own outflow end (`PaddedOutflow`) and its own number of steps,
+    and all rows are advanced together. Returns one `FloodMetrics` per
+    distance, the same as running them one by one.
+    """
+    domains = [river_domain(d, city_width, dx, dt, source_amplitude, simulation_time_factor) for d in distances]
+    sizes = [nx for _, nx, _, _ in domains]
+    nt = max(n for _, _, n, _ in domains)
+
+    def source(t):
+        return source_amplitude * abs(np.sin(2 * np.pi * source_frequency * t)) + initial_baseline
+
+    bcs = [Dirichlet('left', u=source), PaddedOutflow(np.array(sizes) - 1)]
+    solver = Burgers1D(max(sizes), dx, nu, dt, bcs=bcs, u0=initial_baseline, integrator=integrator,
+                       batch=len(distances))
+    gauge = CityGauge([np.linspace(0, L, nx) for L, nx, _, _ in domains],
+                      [(d, d + city_width) for d in distances], dx, initial_baseline, arrival_height,
+                      volume_thresholds, t_end=[n * dt for _, _, n, _ in domains])
+    gauge.update(solver.t, solver.u)
+    for _ in solver.iter_steps(nt):
+        gauge.update(solver.t, solver.u)
+    return gauge.metrics()
 
 
 def simulate_burgers_with_city(
@@ -12,7 +274,10 @@ def simulate_burgers_with_city(
         source_amplitude=0.3,  # Amplitude of the sinusoidal source
         source_frequency=0.8,  # Frequency of the sinusoidal source
         initial_baseline=0.01,
-        simulation_time_factor=1.5  # Factor to determine total simulation time
+        simulation_time_factor=1.5,  # Factor to determine total simulation time
+        integrator='explicit',  # 'imex' treats the diffusion implicitly
+        animation_file='burgers_simulation_with_source.gif',
+        cache=None,
 ):
     """
     Simulates the 1D Burger's equation with a wave source at the left boundary
@@ -25,6 +290,8 @@ def simulate_burgers_with_city(
     The x-axis represents distance in kilometers.
     A sinusoidal source is applied at the left boundary.
     The right boundary condition is zero-gradient (free outflow).
+    The frames come from `run_river`, through the `ResultCache` `cache` if
+    given, so a stored run is only drawn again.
     """
 
     if d_distance_to_city is None:
@@ -39,70 +306,38 @@ def simulate_burgers_with_city(
             except ValueError:
                 print("Invalid input. Please enter a numerical value for 'd'.")
 
-    # Domain length needs to accommodate the city and some space beyond it
-    # Let's set it to d_distance_to_city + city_width + some buffer (e.g., d_distance_to_city / 2 or a fixed value)
-    L = d_distance_to_city + city_width + d_distance_to_city / 2
-    if L < city_width + 10:  # Ensure minimum length for visualization
-        L = city_width + 10
-
-    nx = int(L / dx) + 1
-    x = np.linspace(0, L, nx)
-
-    # Initial condition: baseline value
-    u = np.full(nx, initial_baseline)
-
-    u_hist = [u.copy()]
-
-    # Estimate simulation time needed for the wave to reach and pass the city
-    # This is trickier with a continuous source, let's set a reasonable simulation time
-    # based on some wave propagation speed assumption and domain length.
-    # Assuming a characteristic speed related to the source amplitude or a default value.
-    char_speed = max(source_amplitude, 0.1)
-    estimated_travel_time_to_city_end = (d_distance_to_city + city_width) / char_speed
-    total_sim_time = estimated_travel_time_to_city_end * simulation_time_factor
-    nt = int(total_sim_time / dt)
-
-    nt = min(nt, 10000)  # Cap timesteps to avoid overly long runs, adjust as needed
-    if nt * dt == 0:
-        storage_frequency = 1
-    else:
-        storage_frequency = max(1, nt // 200)  # Store ~200 frames for animation
+    L, nx, nt, total_sim_time = river_domain(d_distance_to_city, city_width, dx, dt, source_amplitude,
+                                             simulation_time_factor)
+    storage_frequency = max(1, nt // ANIMATION_FRAMES)
 
     print(f"Simulation parameters: L={L:.2f}km, dx={dx}km, dt={dt}, nu={nu}")
     print(f"City from {d_distance_to_city:.2f}km to {d_distance_to_city + city_width:.2f}km")
     print(f"Source amplitude={source_amplitude}, frequency={source_frequency}")
     print(f"Target simulation time: {total_sim_time:.2f} (nt={nt} steps). Storing every {storage_frequency} steps.")
 
-    for n_iter in range(nt):
-        un = u.copy()
-
-        u[1:-1] = (un[1:-1] -
-                   dt * un[1:-1] * (un[2:] - un[0:-2]) / (2 * dx) +
-                   nu * dt * (un[2:] - 2 * un[1:-1] + un[0:-2]) / dx ** 2)
-
-        # Boundary condition: sinusoidal inflow on the left
-        current_time_step = n_iter * dt
-        u[0] = source_amplitude * abs(np.sin(2 * np.pi * source_frequency * current_time_step)) + initial_baseline
-
-        # Right boundary: free outflow (Neumann-like)
-        u[-1] = u[-2]
-
-        if n_iter % storage_frequency == 0:
-            u_hist.append(u.copy())
-
-    print(f"Simulation finished. Stored {len(u_hist)} frames.")
+    params = dict(city_width=city_width, dx=dx, dt=dt, nu=nu, source_amplitude=source_amplitude,
+                  source_frequency=source_frequency, initial_baseline=initial_baseline,
+                  simulation_time_factor=simulation_time_factor, integrator=integrator,
+                  n_frames=ANIMATION_FRAMES)
+    if cache is None:
+        run = run_river(d_distance_to_city, **params)
+    else:
+        # float, so that the app, the sweep and this script share entries (20 and 20.0 hash apart)
+        run = cache.call(run_river, float(d_distance_to_city), **params)
+    x = run.x
 
     fig, ax = plt.subplots(figsize=(12, 7))
-    line, = ax.plot(x, u_hist[0], lw=2, color='blue')
+    line, = ax.plot(x, run.frames[0], lw=2, color='blue')
 
     city_start_x = d_distance_to_city
     city_end_x = d_distance_to_city + city_width
     ax.axvline(x=city_start_x, color='red', linestyle='--', linewidth=2, label=f'City Start ({city_start_x:.1f} km)')
     ax.axvline(x=city_end_x, color='red', linestyle='--', linewidth=2, label=f'City End ({city_end_x:.1f} km)')
 
-    max_u_overall = np.max(u_hist) if len(u_hist) > 0 and np.max(
-        u_hist) > initial_baseline else source_amplitude + initial_baseline
-    min_u_overall = np.min(u_hist) if len(u_hist) > 0 else initial_baseline
+    # The limits come from the data bounds: the wave never exceeds the source
+    # peak nor drops below the baseline.
+    max_u_overall = source_amplitude + initial_baseline
+    min_u_overall = initial_baseline
     ax.set_ylim(min_u_overall - 0.1 * abs(max_u_overall if max_u_overall != 0 else 1), max_u_overall * 1.1 + 0.1)
 
     volume_text_x = city_start_x + city_width / 2
@@ -117,8 +352,7 @@ def simulate_burgers_with_city(
 
     city_indices = np.where((x >= city_start_x) & (x <= city_end_x))[0]
 
-    def update(frame_num):
-        current_u = u_hist[frame_num]
+    def update(current_u, current_time_in_animation):
         line.set_ydata(current_u)
 
         integrated_height = 0.0
@@ -127,28 +361,48 @@ def simulate_burgers_with_city(
             integrated_height = np.sum(current_u_in_city) * dx
 
         volume_text.set_text(f'Integrated height in city: {integrated_height:.3f}')
-        current_time_in_animation = frame_num * dt * storage_frequency
         ax.set_title(
             f"1D Burger's Model: Wave from source approaching city (d={d_distance_to_city} km)\nTime: {current_time_in_animation:.2f}",
             fontsize=14)
-        return line, volume_text
 
-    ani_interval = 70
-    ani = FuncAnimation(fig, update, frames=len(u_hist), interval=ani_interval, blit=True, repeat=False)
+    with FigureStream(fig, animation_file, fps=15, artists=[line, volume_text, ax.title]) as stream:
+        for u, t in zip(run.frames, run.times):
+            with phase('plot'):
+                update(u, t)
+            stream.grab()
 
-    animation_file = 'burgers_simulation_with_source.gif'
-    try:
-        ani.save(animation_file, writer='imagemagick', fps=15)
-        print(f"Animation saved to {animation_file}")
-    except Exception as e:
-        print(f"Could not save animation: {e}. Ensure imagemagick or ffmpeg is installed and in your PATH.")
-        print("Attempting to save with Pillow as fallback...")
-        try:
-            ani.save(animation_file, writer='pillow', fps=15)
-            print(f"Animation saved to {animation_file} using Pillow.")
-        except Exception as e2:
-            print(f"Could not save animation with Pillow either: {e2}")
+    print(f"Simulation finished. Stored {stream.n_frames} frames.")
+    print(f"Animation saved to {animation_file}")
+    plt.close(fig)
 
 
 if __name__ == '__main__':
-    simulate_burgers_with_city(d_distance_to_city=20.0)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="1D flood wave travelling from the source to the city.")
+    parser.add_argument('--distance', type=float, nargs='+', default=[20.0],
+                        help="Distance(s) from the source to the city in km")
+    parser.add_argument('--integrator', choices=INTEGRATORS, default='explicit')
+    parser.add_argument('--metrics', action='store_true',
+                        help="Only print arrival time, peak and exceedance per distance (no animation)")
+    parser.add_argument('--threshold', type=float, nargs='*', default=[],
+                        help="City volumes for the exceedance durations printed with --metrics")
+    parser.add_argument('--cache', nargs='?', const=CACHE_DIR, metavar='DIR',
+                        help=f"Reuse the frames of an earlier run from the result cache (default: {CACHE_DIR})")
+    parser.add_argument('--profile', action='store_true', help="Print the time spent per phase at the end")
+    parser.add_argument('--trace', metavar='FILE', help="Also write a Chrome trace of the phases (implies --profile)")
+    args = parser.parse_args()
+    with profiled(args.profile, args.trace):
+        if args.metrics:
+            print(f"{'d [km]':>7} {'arrival':>8} {'peak at':>8} {'peak vol':>9} {'max u':>7}"
+                  + ''.join(f" {'>' + format(v, 'g'):>8}" for v in args.threshold))
+            metrics = flood_metrics_by_distance(args.distance, integrator=args.integrator,
+                                                volume_thresholds=args.threshold)
+            for d, m in zip(args.distance, metrics):
+                arrival = '-' if m.arrival_time is None else f"{m.arrival_time:.2f}"
+                print(f"{d:7.1f} {arrival:>8} {m.peak_time:8.2f} {m.peak_volume:9.4f} {m.max_city_height:7.3f}"
+                      + ''.join(f" {e:8.2f}" for e in m.exceedance))
+        else:
+            cache = None if args.cache is None else ResultCache(args.cache)
+            for d in args.distance:
+                names = {} if len(args.distance) == 1 else {
+                    'animation_file': f'burgers_simulation_with_source_{d:g}.gif'}
+                simulate_burgers_with_city(d_distance_to_city=d, integrator=args.integrator, cache=cache, **names)
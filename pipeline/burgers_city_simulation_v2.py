@@ -1,6 +1,216 @@
+import argparse
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+
+from pipeline.cache import CACHE_DIR, ResultCache
+from pipeline.checkpoints import CHECKPOINT_FILE, STATES_DIR, StateLibrary, load_checkpoint, save_checkpoint
+from pipeline.profiling import phase, profiled
+from pipeline.results import ResultWriter, load_result
+from pipeline.solver import INTEGRATORS, Burgers2D, Dirichlet, Grid2D, Neumann
+from pipeline.streaming import FigureStream
+
+# The run saves a checkpoint whenever a chunk of this many frames has been
+# written to its result directory, so that a resumed run keeps whole chunks
+CHECKPOINT_FRAMES = 32
+# Modules behind a levee run, besides the solver (see `pipeline.cache`)
+CACHE_MODULES = ('burgers_city_simulation_v2.py',)
+# Arguments of `city_frames` that do not change the frames
+_RUN_OPTIONS = ('cache', 'states', 'start', 'checkpoint', 'checkpoint_every')
+
+
+def top_edge_source(max_source_amplitude, source_frequency, simulation_time_h):
+    """
+    Inflow speed at the top edge: a slow ramp (capped at half the maximum
+    amplitude) plus a small oscillation.
+    """
+    def speed(t):
+        gf = min(1.0, t / simulation_time_h)
+        amp = min(max_source_amplitude * gf, max_source_amplitude / 2)
+        return amp + 0.1 * np.sin(2 * np.pi * source_frequency * t)
+
+    return speed
+
+
+def make_city_solver(nx, ny, dx, dy, dt, nu, max_source_amplitude, source_frequency, simulation_time_h,
+                     integrator='explicit', active_tiles=None):
+    """
+    The flood wave enters at the top edge and travels down the river towards
+    the city, so the inflow is a negative (downward) v. Bottom and sides are
+    free outflow. With `active_tiles` only the rows the wave has reached are
+    stepped (see `Burgers2D`; explicit integrator only, ignored otherwise).
+    """
+    speed = top_edge_source(max_source_amplitude, source_frequency, simulation_time_h)
+    bcs = [
+        # source at top edge
+        Dirichlet('top', u=0.0, v=lambda t: -speed(t)),
+        # free outflow at bottom
+        Neumann('bottom'),
+        # free outflow sides
+        Neumann('left'), Neumann('right'),
+    ]
+    return Burgers2D(Grid2D(nx, ny, dx, dy), nu, dt, bcs=bcs, integrator=integrator,
+                     active_tiles=active_tiles if integrator == 'explicit' and active_tiles else None)
+
+
+def city_surface_renderer(ax, X, Y, max_z, domain_width_km, domain_length_km, distance_to_city_km,
+                          city_width_km, city_depth_km, dx, cmap='Blues_r', elev=25, azim=-65):
+    """
+    Draw the static scene (levees, city footprint, labels, view) on `ax` once
+    and return `update(Z, t)`, which only swaps the river surface `Z` and the
+    title. `update` returns the artists that change, in drawing order, for
+    `FigureStream.grab`. Shared by the live run and `render_city_animation`.
+    """
+    # coordinates for levees at x=0 and x=Lx
+    Lx = domain_width_km
+    Ly = domain_length_km
+    # two vertical planes for levees
+    Z_lev = np.array([[0., 0.],
+                      [.6, .6]])
+    Y_lev = np.array([[0., Ly],
+                      [0., Ly]])
+    X0 = np.full_like(Z_lev, fill_value=0)  # x=0
+    X1 = np.full_like(Z_lev, fill_value=Lx)  # x=Lx
+
+    # green levees
+    levees = [ax.plot_surface(X0, Y_lev, Z_lev, color='green', alpha=0.5),
+              ax.plot_surface(X1, Y_lev, Z_lev, color='green', alpha=0.5)]
+    # the levee facing the camera has to be drawn over the river surface
+    front_levee = levees[1] if np.cos(np.radians(azim)) > 0 else levees[0]
+
+    # red city footprint sticking out of domain
+    cx = (domain_width_km - city_width_km) / 2
+    cy = domain_length_km - distance_to_city_km
+    eps = 3 * dx  # margines w km, można dostosować
+
+    # Rozszerzamy footprint o eps w osi X
+    Xc = np.array([
+        [cx - eps, cx + city_width_km + eps],
+        [cx - eps, cx + city_width_km + eps]
+    ])
+    Yc = np.array([
+        [cy, cy],
+        [cy + city_depth_km, cy + city_depth_km]
+    ])
+    # podnieś troszkę nad max_z, żeby była dobrze widoczna
+    Zc = np.full_like(Xc, max_z * 0.0)
+
+    ax.plot_surface(Xc, Yc, Zc, color='red', alpha=0.6)
+
+    ax.set_zlim(0, max_z * 1.1)
+    ax.set_xlabel("Width of the river (m)")
+    ax.set_ylabel("Length of the river (km)")
+    ax.set_zlabel("Height (m)")
+    ax.view_init(elev=elev, azim=azim)
+
+    surface = None
+
+    def update(Z, t):
+        nonlocal surface
+        if surface is not None:
+            surface.remove()
+        # surface
+        surface = ax.plot_surface(X, Y, Z, cmap=cmap,
+                                  vmin=0, vmax=max_z, edgecolor='none')
+        ax.set_title(f"Time: {t:.2f}h", fontsize=14)
+        return [surface, front_levee, ax.title]
+
+    return update
+
+
+def city_domain(distance_to_city_km, city_depth_km, domain_width_km, dx, dy):
+    """`(domain_length_km, nx, ny)`: the river continues half the distance again past the city."""
+    domain_length_km = distance_to_city_km + city_depth_km + distance_to_city_km / 2
+    return domain_length_km, int(domain_width_km / dx), int(domain_length_km / dy)
+
+
+def spin_up_city(solver, params, states=None):
+    """
+    Advance the fresh city `solver` (built from the `city_frames` `params`)
+    to `params['spin_up_h']` with the same stepping as the run, through the
+    `StateLibrary` `states` when given. The stored states do not depend on
+    the number of frames, so runs differing only in that share them.
+    """
+    t_end = params['spin_up_h']
+
+    def advance(solver, t):
+        if params['adaptive']:
+            for _ in solver.iter_until([t], dt_max=0.1 / params['source_frequency']):
+                pass
+        else:
+            for _ in solver.iter_steps(int(t / params['dt']) - solver.n_steps):
+                pass
+
+    with phase('spin_up'):
+        if states is None:
+            advance(solver, t_end)
+        else:
+            base = {name: value for name, value in params.items() if name not in ('n_frames', 'spin_up_h')}
+            states.spun_up(solver, 'levees', base, t_end, advance, modules=CACHE_MODULES)
+
+
+def city_frames(distance_to_city_km=100.0, city_width_km=15.0, city_depth_km=8.0, domain_width_km=15.0, dx=0.5,
+                dy=0.5, dt=0.04, nu=1.2, max_source_amplitude=1.5, source_frequency=0.5,
+                simulation_time_h=24.0 * 60, adaptive=True, n_frames=150, integrator='explicit', active_tiles=8,
+                spin_up_h=0.0, cache=None, states=None, start=None, checkpoint=None,
+                checkpoint_every=CHECKPOINT_FRAMES):
+    """
+    Generator of the `(t, magnitude)` frames of the run drawn by
+    `simulate_2d_burgers_with_city_surface_plot` (same parameters), computed
+    as they are consumed. With a `ResultCache` `cache` they are read from it
+    if this run is stored, and stored there (float32) after the last frame
+    otherwise.
+
+    With `spin_up_h` the frames cover the run after that time only; the
+    spun-up river comes from the `StateLibrary` `states` when stored there
+    (see `spin_up_city`). With a `checkpoint` path the solver state is saved
+    there every `checkpoint_every` frames, and a run given such a
+    `Checkpoint` as `start` continues from it, yielding the later frames
+    exactly as the uninterrupted run.
+    """
+    params = {name: value for name, value in locals().items() if name not in _RUN_OPTIONS}
+    key = None
+    if cache is not None and start is None:
+        key = cache.key('levees', params, modules=CACHE_MODULES)
+    stored = None if key is None else cache.get(key)
+    if stored is not None:
+        yield from zip(stored['times'], stored['magnitude'])
+        return
+
+    _, nx, ny = city_domain(distance_to_city_km, city_depth_km, domain_width_km, dx, dy)
+    solver = make_city_solver(nx, ny, dx, dy, dt, nu, max_source_amplitude, source_frequency, simulation_time_h,
+                              integrator, active_tiles)
+    if start is not None:
+        solver.restore(start.state)
+    elif spin_up_h:
+        spin_up_city(solver, params, states)
+    first = 0 if start is None else start.frame
+    if adaptive:
+        # Resolve the source oscillation with at least 10 steps per period
+        frame_times = np.linspace(spin_up_h + (simulation_time_h - spin_up_h) / n_frames, simulation_time_h,
+                                  n_frames)
+        steps = solver.iter_until(frame_times[first:], dt_max=0.1 / source_frequency)
+    else:
+        n_spin_up, nt = int(spin_up_h / dt), int(simulation_time_h / dt)
+        store_every = max(1, (nt - n_spin_up) // n_frames)
+        # Frames fall on the same steps when the run continues from a checkpoint
+        done = solver.n_steps - n_spin_up
+        steps = (n for n in solver.iter_steps(nt - solver.n_steps) if (done + n) % store_every == 0)
+    times, kept = [], []
+    for frame, _ in enumerate(steps, start=first + 1):
+        if key is None:
+            yield solver.t, solver.magnitude
+        else:
+            # Cached and fresh runs yield the same float32 frames
+            times.append(solver.t)
+            kept.append(solver.magnitude.astype(np.float32))
+            yield times[-1], kept[-1]
+        # Saved once the consumer has handled the frame (see CHECKPOINT_FRAMES)
+        if checkpoint is not None and frame % checkpoint_every == 0:
+            save_checkpoint(checkpoint, solver, params, frame)
+    if key is not None:
+        cache.put(key, {'times': np.array(times), 'magnitude': np.array(kept)})
 
 
 def simulate_2d_burgers_with_city_surface_plot(
@@ -15,130 +225,171 @@ def simulate_2d_burgers_with_city_surface_plot(
         max_source_amplitude=1.5,
         source_frequency=0.5,
         simulation_time_h=24.0 * 60,
+        adaptive=True,
+        n_frames=150,
+        integrator='explicit',
+        active_tiles=8,
+        spin_up_h=0.0,
+        result_dir=None,
+        animation_file=None,
+        cache=None,
+        states=None,
+        resume=False,
 ):
+    """
+    With `adaptive=True` every step uses the largest stable dt for the current
+    velocities and viscosity, and the `n_frames` frames are taken at equally
+    spaced times. With `adaptive=False` the fixed `dt` is used.
+    `integrator='imex'` treats diffusion implicitly, so only the advection
+    limit applies and the grid can be refined without the `dx**2 / nu` cost.
+    `active_tiles` (explicit only) skips the part of the river the wave has
+    not reached yet, in tiles of that many rows; None or 0 steps every cell.
+    The stored frames are also written to `result_dir` (float16, see
+    `pipeline.results`) so the animation can be re-rendered with
+    `render_city_animation` without re-running the simulation.
+    With a `ResultCache` `cache` a run with the same parameters is only
+    drawn again (see `city_frames`).
+    With `spin_up_h` the animation starts from the river at that time,
+    spun up once per set of parameters when a `StateLibrary` `states` is
+    given. A checkpoint is saved in `result_dir` every `CHECKPOINT_FRAMES`
+    frames; with `resume=True` a stopped run with the same parameters
+    continues from it, and only its stored frames are drawn again.
+    """
     # --- Stability check (CFL) ---
     dt_diff = min(dx, dy) ** 2 / (4 * nu)
     dt_adv = min(dx, dy) / (max_source_amplitude + 1e-6)
     print(f"dt ≤ {dt_diff:.3f} (diff), dt ≤ {dt_adv:.3f} (adv)")
-    if dt > dt_diff or dt > dt_adv:
+    if not adaptive and (dt > dt_diff and integrator == 'explicit' or dt > dt_adv):
         print("Uwaga: dt może być niestabilne!")
 
     # --- Grid setup ---
-    domain_length_km = distance_to_city_km + city_depth_km + distance_to_city_km / 2
-    nx, ny = int(domain_width_km / dx), int(domain_length_km / dy)
+    domain_length_km, nx, ny = city_domain(distance_to_city_km, city_depth_km, domain_width_km, dx, dy)
     x = np.linspace(0, domain_width_km, nx)
     y = np.linspace(0, domain_length_km, ny)
     X, Y = np.meshgrid(x, y)
 
-    # --- Initial fields ---
-    u = np.zeros((ny, nx))
-    v = np.zeros((ny, nx))
-
-    nt = int(simulation_time_h / dt)
-    store = max(1, nt // 150)
-    v_hist = []
-
-    # --- Main time loop ---
-    for n in range(nt):
-        un, vn = u.copy(), v.copy()
+    # --- Animation setup ---
+    fig = plt.figure(figsize=(14, 10))
+    ax = fig.add_subplot(111, projection='3d')
+    # Frames are encoded while the solver runs, so the colour/height scale is
+    # fixed up front by the largest inflow speed (the flow never exceeds it).
+    max_z = max_source_amplitude / 2 + 0.1
+    geometry = dict(domain_width_km=domain_width_km, domain_length_km=domain_length_km,
+                    distance_to_city_km=distance_to_city_km, city_width_km=city_width_km,
+                    city_depth_km=city_depth_km, dx=dx)
+    update = city_surface_renderer(ax, X, Y, max_z, **geometry)
 
-        # diffusion
-        u_xx = (np.roll(un, 1, 1) - 2 * un + np.roll(un, -1, 1)) / dx ** 2
-        u_yy = (np.roll(un, 1, 0) - 2 * un + np.roll(un, -1, 0)) / dy ** 2
-        v_xx = (np.roll(vn, 1, 1) - 2 * vn + np.roll(vn, -1, 1)) / dx ** 2
-        v_yy = (np.roll(vn, 1, 0) - 2 * vn + np.roll(vn, -1, 0)) / dy ** 2
+    if animation_file is None:
+        animation_file = f'burgers2d_with_levees_{max_source_amplitude}.gif'
+    if result_dir is None:
+        result_dir = f'burgers2d_with_levees_{max_source_amplitude}'
 
-        # reversed advection (wave goes downward)
-        u_adv_x = un * (np.roll(un, -1, 1) - un) / dx
-        u_adv_y = vn * (np.roll(un, -1, 0) - un) / dy
-        v_adv_x = un * (np.roll(vn, -1, 1) - vn) / dx
-        v_adv_y = vn * (np.roll(vn, -1, 0) - vn) / dy
+    # --- Main time loop: each frame is rendered and encoded as soon as it is reached ---
+    run = dict(distance_to_city_km=distance_to_city_km, city_width_km=city_width_km, city_depth_km=city_depth_km,
+               domain_width_km=domain_width_km, dx=dx, dy=dy, dt=dt, nu=nu,
+               max_source_amplitude=max_source_amplitude, source_frequency=source_frequency,
+               simulation_time_h=simulation_time_h, adaptive=adaptive, n_frames=n_frames, integrator=integrator,
+               active_tiles=active_tiles, spin_up_h=spin_up_h)
+    checkpoint_file = os.path.join(result_dir, CHECKPOINT_FILE)
+    start = load_checkpoint(checkpoint_file, run) if resume else None
+    if resume and start is None:
+        print(f"No checkpoint of this run in {result_dir}/, starting from the beginning.")
+    frames = city_frames(**run, cache=cache, states=states, start=start, checkpoint=checkpoint_file)
+    store_every = None if adaptive else max(1, (int(simulation_time_h / dt) - int(spin_up_h / dt)) // n_frames)
+    metadata = {
+        'grid': {'nx': nx, 'ny': ny, 'dx': dx, 'dy': dy},
+        'dt': dt, 'adaptive': adaptive, 'store_every': store_every, 'integrator': integrator,
+        'active_tiles': active_tiles, 'spin_up_h': spin_up_h,
+        'params': {**geometry, 'nu': nu, 'max_source_amplitude': max_source_amplitude,
+                   'source_frequency': source_frequency, 'simulation_time_h': simulation_time_h, 'max_z': max_z},
+    }
+    kept = 0 if start is None else start.frame
+    resumed = []
+    if kept:
+        print(f"Resuming at t={start.state['t']:.2f}h after {kept} stored frames.")
+        # Copied and unmapped before the writer replaces the chunks after the checkpoint
+        # (a file still mapped cannot be rewritten on Windows)
+        stored = load_result(result_dir)
+        resumed = [(t, np.array(magnitude)) for t, magnitude in zip(stored.times[:kept], stored['magnitude'])]
+        del stored
+    with FigureStream(fig, animation_file, fps=20) as stream, \
+            ResultWriter(result_dir, fields=('magnitude',), metadata=metadata, chunk_frames=CHECKPOINT_FRAMES,
+                         keep_frames=kept) as result:
+        for t, magnitude in resumed:
+            with phase('plot_surface'):
+                artists = update(magnitude.astype(float), t)
+            stream.grab(artists)
+        for t, magnitude in frames:
+            result.append(t, magnitude=magnitude)
+            with phase('plot_surface'):
+                artists = update(magnitude, t)
+            stream.grab(artists)
 
-        # time update
-        u = un + dt * (nu * (u_xx + u_yy) + u_adv_x + u_adv_y)
-        v = vn + dt * (nu * (v_xx + v_yy) + v_adv_x + v_adv_y)
+    print(f"Stored {stream.n_frames} frames.")
+    print(f"Saved: {animation_file} (frames in {result_dir}/)")
+    plt.close(fig)
 
-        # source at top edge
-        t = n * dt
-        gf = min(1.0, t / simulation_time_h)
-        amp = min(max_source_amplitude * gf, max_source_amplitude / 2)
-        v[-1, :] = amp + 0.1 * np.sin(2 * np.pi * source_frequency * t)
-        u[-1, :] = 0
 
-        # free outflow at bottom
-        u[0, :] = u[1, :]
-        v[0, :] = v[1, :]
-        # free outflow sides
-        u[:, 0], u[:, -1] = u[:, 1], u[:, -2]
-        v[:, 0], v[:, -1] = v[:, 1], v[:, -2]
-
-        if n % store == 0:
-            v_hist.append(np.sqrt(u ** 2 + v ** 2))
-
-    print(f"Stored {len(v_hist)} frames.")
+def render_city_animation(result_dir, animation_file=None, cmap='Blues_r', elev=25, azim=-65, fps=20):
+    """
+    Re-render the animation from frames stored by
+    `simulate_2d_burgers_with_city_surface_plot`, without running the solver;
+    only the styling (colormap, view angle, fps) can change.
+    """
+    result = load_result(result_dir)
+    grid, params = result.meta['grid'], result.meta['params']
+    x = np.linspace(0, params['domain_width_km'], grid['nx'])
+    y = np.linspace(0, params['domain_length_km'], grid['ny'])
+    X, Y = np.meshgrid(x, y)
 
-    # --- Animation setup ---
     fig = plt.figure(figsize=(14, 10))
     ax = fig.add_subplot(111, projection='3d')
-    max_z = np.max(v_hist)
+    update = city_surface_renderer(ax, X, Y, params['max_z'], params['domain_width_km'], params['domain_length_km'],
+                                   params['distance_to_city_km'], params['city_width_km'], params['city_depth_km'],
+                                   params['dx'], cmap=cmap, elev=elev, azim=azim)
 
-    # coordinates for levees at x=0 and x=Lx
-    Lx = domain_width_km
-    Ly = domain_length_km
-    # two vertical planes for levees
-    Z_lev = np.array([[0., 0.],
-                      [.6, .6]])
-    Y_lev = np.array([[0., Ly],
-                      [0., Ly]])
-    X0 = np.full_like(Z_lev, fill_value=0)  # x=0
-    X1 = np.full_like(Z_lev, fill_value=Lx)  # x=Lx
+    if animation_file is None:
+        animation_file = os.path.normpath(result_dir) + '.gif'
+    with FigureStream(fig, animation_file, fps=fps) as stream:
+        for Z, t in zip(result['magnitude'], result.times):
+            with phase('plot_surface'):
+                artists = update(Z, t)
+            stream.grab(artists)
 
-    def update(i):
-        ax.clear()
-        Z = v_hist[i]
-        # surface
-        ax.plot_surface(X, Y, Z, cmap='Blues_r',
-                        vmin=0, vmax=max_z, edgecolor='none')
-
-        # green levees
-        ax.plot_surface(X0, Y_lev, Z_lev, color='green', alpha=0.5)
-        ax.plot_surface(X1, Y_lev, Z_lev, color='green', alpha=0.5)
-
-        # red city footprint sticking out of domain
-        cx = (domain_width_km - city_width_km) / 2
-        cy = domain_length_km - distance_to_city_km
-        eps = 3 * dx  # margines w km, można dostosować
-
-        # Rozszerzamy footprint o eps w osi X
-        Xc = np.array([
-            [cx - eps, cx + city_width_km + eps],
-            [cx - eps, cx + city_width_km + eps]
-        ])
-        Yc = np.array([
-            [cy, cy],
-            [cy + city_depth_km, cy + city_depth_km]
-        ])
-        # podnieś troszkę nad max_z, żeby była dobrze widoczna
-        Zc = np.full_like(Xc, max_z * 0.0)
-
-        ax.plot_surface(Xc, Yc, Zc, color='red', alpha=0.6)
-
-        ax.set_zlim(0, max_z * 1.1)
-        ax.set_xlabel("Width of the river (m)")
-        ax.set_ylabel("Length of the river (km)")
-        ax.set_zlabel("Height (m)")
-        ax.view_init(elev=25, azim=-65)
-        ax.set_title(f"Time: {i * dt * store:.2f}h", fontsize=14)
-
-    ani = FuncAnimation(fig, update, frames=len(v_hist),
-                        interval=50, blit=False)
-
-    try:
-        ani.save(f'burgers2d_with_levees_{max_source_amplitude}.gif', writer='pillow', fps=20)
-        print("Saved: burgers2d_with_levees.gif")
-    except Exception as e:
-        print(f"Error saving: {e}")
+    print(f"Rendered {stream.n_frames} frames from {result_dir}/ to {animation_file}")
+    plt.close(fig)
 
 
 if __name__ == '__main__':
-    simulate_2d_burgers_with_city_surface_plot()
+    parser = argparse.ArgumentParser(description="2D flood wave travelling down the river towards the city.")
+    parser.add_argument('--amplitude', type=float, default=1.5, help="Maximum source amplitude [m/s]")
+    parser.add_argument('--dx', type=float, default=0.5, help="Grid spacing in km (both directions)")
+    parser.add_argument('--integrator', choices=INTEGRATORS, default='explicit')
+    parser.add_argument('--active-tiles', type=int, metavar='ROWS', default=8,
+                        help="Only step the rows the wave has reached, in tiles of ROWS rows (0: every row)")
+    parser.add_argument('--result-dir', default=None, help="Directory for the stored frames")
+    parser.add_argument('--cache', nargs='?', const=CACHE_DIR, metavar='DIR',
+                        help=f"Reuse the frames of an earlier run from the result cache (default: {CACHE_DIR})")
+    parser.add_argument('--spin-up', type=float, metavar='HOURS', default=0.0,
+                        help="Start the animation from the river spun up to HOURS (kept in the state library)")
+    parser.add_argument('--states', metavar='DIR', default=STATES_DIR,
+                        help=f"State library for --spin-up (default: {STATES_DIR})")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue a stopped run from the checkpoint in its result directory")
+    parser.add_argument('--render-from', metavar='RESULT_DIR', default=None,
+                        help="Only re-render the animation from stored frames (no simulation)")
+    parser.add_argument('--cmap', default='Blues_r', help="Colormap used with --render-from")
+    parser.add_argument('--elev', type=float, default=25, help="View elevation used with --render-from")
+    parser.add_argument('--azim', type=float, default=-65, help="View azimuth used with --render-from")
+    parser.add_argument('--profile', action='store_true', help="Print the time spent per phase at the end")
+    parser.add_argument('--trace', metavar='FILE', help="Also write a Chrome trace of the phases (implies --profile)")
+    args = parser.parse_args()
+    with profiled(args.profile, args.trace):
+        if args.render_from:
+            render_city_animation(args.render_from, cmap=args.cmap, elev=args.elev, azim=args.azim)
+        else:
+            simulate_2d_burgers_with_city_surface_plot(max_source_amplitude=args.amplitude, dx=args.dx, dy=args.dx,
+                                                       integrator=args.integrator, active_tiles=args.active_tiles,
+                                                       spin_up_h=args.spin_up, result_dir=args.result_dir,
+                                                       cache=None if args.cache is None else ResultCache(args.cache),
+                                                       states=StateLibrary(args.states), resume=args.resume)
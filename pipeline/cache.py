@@ -0,0 +1,209 @@
+"""
+Persistent cache of solver outputs, shared by every process using the same
+directory (app workers, restarts, sweeps, command line runs).
+
+Entries are content addressed: the key hashes the name of the run, its
+parameters and the source of the modules that compute it (the solver
+version), so editing the solver invalidates old entries without any
+bookkeeping. An entry is one compressed `.npz` of the run's arrays:
+
+    cache = ResultCache()                              # build/cache, 1 GiB
+    run = cache.call(run_river, 30.0, n_frames=60)     # computed once, then loaded
+
+    key = cache.key('levees', params, modules=('burgers_city_simulation_v2.py',))
+    arrays = cache.get(key)                            # dict of arrays, or None
+    cache.put(key, {'times': times, 'magnitude': frames})
+
+Entries are written to a temporary file and renamed into place, so readers
+in other processes see either the whole entry or none. Reading an entry
+refreshes its modification time, and `put` removes the least recently used
+entries once the directory holds more than `max_bytes`.
+
+Fill the cache with the outputs of the parameter sweep (without drawing) by
+
+    python -m pipeline.sweep --warm-cache
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from pipeline.profiling import count, phase
+
+CACHE_DIR = os.path.join('build', 'cache')
+MAX_BYTES = 1 << 30
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Every cached run depends on these (solver.py masks through geometry.py); callers add their own driver modules
+SOLVER_MODULES = ('solver.py', 'kernels_numba.py', 'geometry.py')
+# Temporary files older than this were left by a crashed writer
+STALE_SECONDS = 3600
+_TYPE_FIELD = '__type__'
+
+
+@lru_cache(maxsize=None)
+def _source_hash(path):
+    with open(path, 'rb') as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def solver_version(modules=()):
+    """Hash of the source of `SOLVER_MODULES` plus `modules` (file names in `pipeline/`, or paths)."""
+    h = hashlib.sha256()
+    for module in SOLVER_MODULES + tuple(modules):
+        h.update(_source_hash(os.path.join(PIPELINE_DIR, module)).encode())
+    return h.hexdigest()
+
+
+def run_key(name, params, modules=()):
+    """Hash of run `name` with the JSON-serialisable `params`, computed by `modules` (see `solver_version`)."""
+    request = json.dumps({'name': name, 'params': params, 'version': solver_version(modules)},
+                         sort_keys=True, default=repr)
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def save_npz(path, arrays):
+    """
+    Write the dict `arrays` to `path` as a compressed .npz through a
+    temporary file renamed into place, so that readers never see a partial file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            np.savez_compressed(fp, **arrays)
+        # mkstemp creates the file private; it is shared like any build output
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class ResultCache:
+    """Content-addressed store of arrays on disk; see the module docstring."""
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def key(self, name, params, modules=()):
+        """Key of run `name` with the JSON-serialisable `params`, computed by `modules` (see `run_key`)."""
+        return run_key(name, params, modules)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + '.npz')
+
+    def get(self, key):
+        """Arrays stored under `key` as a dict, or None."""
+        path = self._file(key)
+        try:
+            with phase('cache_load'), np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            # Missing, or evicted by another process before it could be opened
+            count('cache_misses')
+            return None
+        count('cache_hits')
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return arrays
+
+    def put(self, key, arrays):
+        """Store the dict `arrays` under `key` (compressed), then evict down to `max_bytes`."""
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with phase('cache_store'):
+            save_npz(path, arrays)
+        count('bytes_written', os.path.getsize(path))
+        self.evict()
+
+    def _files(self, suffix):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(suffix):
+                    path = os.path.join(root, name)
+                    try:
+                        yield os.stat(path), path
+                    except FileNotFoundError:
+                        pass
+
+    def entries(self):
+        """`(last use, bytes, path)` of every entry, least recently used first."""
+        return sorted((stat.st_mtime, stat.st_size, path) for stat, path in self._files('.npz'))
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries until at most `max_bytes` (default `self.max_bytes`) remain."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        for stat, path in list(self._files('.tmp')):
+            if time.time() - stat.st_mtime > STALE_SECONDS:
+                self._remove(path)
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            count('cache_evictions')
+
+    def clear(self):
+        self.evict(0)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def call(self, fn, *args, progress=None, **kwargs):
+        """
+        `fn(*args, **kwargs)` for a module level `fn` returning a namedtuple
+        of arrays (e.g. `run_river`), loaded from the cache when stored.
+        `progress` is passed on to `fn` when it has to run. The key holds
+        every argument by name, defaults included, so `call(fn, 30.0)` and
+        `call(fn, d=30.0)` share an entry.
+        """
+        module = sys.modules[fn.__module__]
+        name = f'{os.path.basename(module.__file__)}:{fn.__qualname__}'
+        arguments = inspect.signature(fn).bind(*args, **kwargs)
+        arguments.apply_defaults()
+        key = self.key(name, {k: v for k, v in arguments.arguments.items() if k != 'progress'},
+                       modules=(module.__file__,))
+        arrays = self.get(key)
+        if arrays is not None:
+            # The result type is looked up next to `fn`, which also works for scripts run as __main__
+            result_type = getattr(module, str(arrays.pop(_TYPE_FIELD)))
+            return result_type(**arrays)
+        if progress is not None:
+            kwargs = dict(kwargs, progress=progress)
+        result = fn(*args, **kwargs)
+        self.put(key, {**result._asdict(), _TYPE_FIELD: type(result).__name__})
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or empty the result cache (see pipeline.sweep "
+                                                 "--warm-cache to fill it).")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--max-bytes', type=int, default=None, help="Evict down to this size")
+    parser.add_argument('--clear', action='store_true', help="Remove every entry")
+    args = parser.parse_args()
+    cache = ResultCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+    elif args.max_bytes is not None:
+        cache.evict(args.max_bytes)
+    entries = cache.entries()
+    print(f"{len(entries)} entries, {sum(size for _, size, _ in entries) / 1e6:.1f} MB in {args.cache_dir}")
@@ -0,0 +1,135 @@
+"""
+Checkpoints of solver state, and a library of spun-up states to start from.
+
+A checkpoint is one compressed `.npz` with `TimeStepper.checkpoint()` (the
+fields, `t` and `n_steps`), the parameters the solver was built with and the
+number of frames the run had produced. The solvers hold no random state, so
+a solver built from the same parameters continues after `restore` exactly as
+the uninterrupted run would:
+
+    save_checkpoint('run/checkpoint.npz', solver, params, frame=64)
+    ...
+    checkpoint = load_checkpoint('run/checkpoint.npz', params)    # None if missing or for other parameters
+    solver.restore(checkpoint.state)
+
+Checkpoints are written atomically (see `pipeline.cache.save_npz`), so a run
+killed while saving one still leaves the previous checkpoint.
+`simulate_2d_burgers_with_city_surface_plot` saves one next to its stored
+frames every `CHECKPOINT_FRAMES` frames and continues from it with `--resume`.
+
+`StateLibrary` keeps spun-up states (e.g. the river once the flood ramp has
+filled it) per run and time, so that runs starting from such a state only
+compute what comes after it, and a longer spin-up continues from the
+latest shorter one:
+
+    states = StateLibrary()                                   # build/states
+    t0 = states.spun_up(solver, 'levees', params, 720.0, advance)
+"""
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from pipeline.cache import run_key, save_npz
+from pipeline.profiling import count, phase
+
+CHECKPOINT_FILE = 'checkpoint.npz'
+STATES_DIR = os.path.join('build', 'states')
+_PARAMS_FIELD = '__params__'
+_FRAME_FIELD = '__frame__'
+
+Checkpoint = namedtuple('Checkpoint', 'state params frame')
+
+
+def _encode(params):
+    return json.dumps(params, sort_keys=True, default=repr)
+
+
+def save_checkpoint(path, solver, params, frame=0):
+    """Save the state of `solver`, built with the JSON-serialisable `params`, after `frame` frames to `path`."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with phase('checkpoint'):
+        save_npz(path, {**solver.checkpoint(), _PARAMS_FIELD: _encode(params), _FRAME_FIELD: frame})
+    count('checkpoints')
+
+
+def load_checkpoint(path, params=None):
+    """
+    `Checkpoint(state, params, frame)` saved at `path`, or None if there is
+    none or (when `params` are given) it was saved for other parameters.
+    """
+    try:
+        with np.load(path) as data:
+            state = {name: data[name] for name in data.files}
+    except (OSError, ValueError):
+        return None
+    stored = str(state.pop(_PARAMS_FIELD))
+    if params is not None and stored != _encode(params):
+        return None
+    return Checkpoint(state, json.loads(stored), int(state.pop(_FRAME_FIELD)))
+
+
+class StateLibrary:
+    """
+    Spun-up solver states on disk: one directory per run (name, parameters
+    and solver version, as in `ResultCache.key`) holding one checkpoint per
+    stored time. States are small (the fields of one time) and never
+    evicted; remove the directory to start over.
+    """
+
+    def __init__(self, path=STATES_DIR):
+        self.path = path
+
+    def _dir(self, name, params, modules):
+        return os.path.join(self.path, name, run_key(name, params, modules)[:16])
+
+    def times(self, name, params, modules=()):
+        """Times of the stored states of this run, ascending."""
+        try:
+            files = os.listdir(self._dir(name, params, modules))
+        except FileNotFoundError:
+            return []
+        return sorted(float(f[:-len('.npz')]) for f in files if f.endswith('.npz'))
+
+    def get(self, name, params, t, modules=()):
+        """State (see `TimeStepper.checkpoint`) of the latest stored time not after `t`, or None."""
+        earlier = [s for s in self.times(name, params, modules) if s <= t + 1e-9 * max(1.0, abs(t))]
+        if not earlier:
+            return None
+        checkpoint = load_checkpoint(os.path.join(self._dir(name, params, modules), f'{earlier[-1]!r}.npz'))
+        return None if checkpoint is None else checkpoint.state
+
+    def put(self, name, params, solver, modules=()):
+        """Store the current state of `solver` under its time."""
+        save_checkpoint(os.path.join(self._dir(name, params, modules), f'{float(solver.t)!r}.npz'), solver, params)
+
+    def spun_up(self, solver, name, params, t, advance, modules=()):
+        """
+        Bring the fresh `solver` of run `name` (built from `params`) to time
+        `t`: restore the latest stored state not after `t`, call
+        `advance(solver, t)` for the rest and store the state reached.
+        Returns the time of the stored state used (0.0 if none).
+        """
+        state = self.get(name, params, t, modules)
+        if state is not None:
+            solver.restore(state)
+            count('states_reused')
+        start = solver.t
+        advance(solver, t)
+        if solver.t > start:
+            self.put(name, params, solver, modules)
+        return start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="List the spun-up states in the state library.")
+    parser.add_argument('--states-dir', default=STATES_DIR)
+    args = parser.parse_args()
+    for root, _, files in sorted(os.walk(args.states_dir)):
+        states = sorted(float(f[:-len('.npz')]) for f in files if f.endswith('.npz'))
+        if states:
+            size = sum(os.path.getsize(os.path.join(root, f)) for f in files)
+            print(f"{os.path.relpath(root, args.states_dir)}: {len(states)} states, "
+                  f"t = {', '.join(f'{t:g}' for t in states)} ({size / 1e6:.1f} MB)")
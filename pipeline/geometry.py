@@ -0,0 +1,223 @@
+"""
+Obstacle geometry: shapes, rasterization onto the solver grid and cached
+cell indices.
+
+Shapes are immutable (hashable) and use cell coordinates by default: cell
+`(i, j)` (row, column) has its centre at `x = j`, `y = i`. Pass `cell` and
+`origin` to `rasterize` / `coverage` to place them in physical units instead
+(e.g. `cell=(grid.dx, grid.dy), origin=(grid.dx / 2, grid.dy / 2)`).
+
+    piers = (Rectangle(20, 50, 4, 12, angle=15), Circle(60, 50, 6))
+    mask = rasterize(piers, (100, 100))            # cell centres inside
+    frac = coverage(piers, (100, 100), samples=4)  # fraction of each cell covered
+
+Every shape is evaluated only over the cells of its bounding box, and
+results are cached, so masks shared by several runs are built once.
+"""
+from collections import namedtuple
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+
+class Circle(namedtuple('Circle', 'cx cy r')):
+    """Disk of radius `r` around `(cx, cy)`, boundary included."""
+
+    __slots__ = ()
+
+    def bounds(self):
+        return self.cx - self.r, self.cy - self.r, self.cx + self.r, self.cy + self.r
+
+    def contains(self, x, y):
+        return (x - self.cx) ** 2 + (y - self.cy) ** 2 <= self.r ** 2
+
+
+class Polygon(namedtuple('Polygon', 'vertices')):
+    """
+    Simple polygon (convex or not) given by its `(x, y)` vertices in order.
+    Points on an edge count as inside, like the closed disk of `Circle`.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, vertices):
+        return super().__new__(cls, tuple((float(x), float(y)) for x, y in vertices))
+
+    def bounds(self):
+        xs, ys = zip(*self.vertices)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def contains(self, x, y):
+        x, y = np.broadcast_arrays(x, y)
+        inside = np.zeros(x.shape, dtype=bool)
+        on_edge = np.zeros(x.shape, dtype=bool)
+        vertices = self.vertices
+        scale = max(b - a for a, b in zip(self.bounds()[:2], self.bounds()[2:])) or 1.0
+        for (x0, y0), (x1, y1) in zip(vertices, vertices[1:] + vertices[:1]):
+            # even-odd rule: count edges crossed by a ray towards +x
+            if y0 != y1:
+                crosses = (y0 > y) != (y1 > y)
+                x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+                inside ^= crosses & (x < x_cross)
+            # closed shape: points on the segment itself
+            cross = (x1 - x0) * (y - y0) - (y1 - y0) * (x - x0)
+            on_edge |= ((np.abs(cross) <= 1e-9 * scale * np.hypot(x1 - x0, y1 - y0))
+                        & (x >= min(x0, x1)) & (x <= max(x0, x1)) & (y >= min(y0, y1)) & (y <= max(y0, y1)))
+        return inside | on_edge
+
+
+def Rectangle(cx, cy, width, height, angle=0.0):
+    """`Polygon` of a `width` x `height` rectangle centred on `(cx, cy)`, rotated by `angle` degrees."""
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+    corners = [(-width / 2, -height / 2), (width / 2, -height / 2), (width / 2, height / 2), (-width / 2, height / 2)]
+    return Polygon([(cx + c * dx - s * dy, cy + s * dx + c * dy) for dx, dy in corners])
+
+
+def Triangle(cx, base_y, half_base, height):
+    """Isosceles `Polygon` with its base at `base_y` and its tip `height` above it (towards +y)."""
+    return Polygon([(cx - half_base, base_y), (cx + half_base, base_y), (cx, base_y + height)])
+
+
+def Pier(cx, cy, length, width, angle=0.0):
+    """
+    Bridge pier: a rectangle with a rounded (semicircular) nose at both ends,
+    `length` along the flow (+y when `angle=0`).
+    """
+    r = width / 2
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+    half = length / 2 - r
+    arc = np.linspace(0, np.pi, 9)
+    local = ([(r * np.cos(a), half + r * np.sin(a)) for a in arc]
+             + [(-r * np.cos(a), -half - r * np.sin(a)) for a in arc])
+    return Polygon([(cx + c * dx - s * dy, cy + s * dx + c * dy) for dx, dy in local])
+
+
+def Weir(y, x0, x1, thickness, gaps=()):
+    """
+    Weir across the river at height `y`: a bar from `x0` to `x1`, `thickness`
+    thick, with openings `gaps` given as `(x_start, x_end)` pairs. Returns a
+    tuple of `Rectangle`s (one per solid section).
+    """
+    sections, start = [], x0
+    for a, b in sorted(gaps) + [(x1, x1)]:
+        if a > start:
+            sections.append(Rectangle((start + a) / 2, y, a - start, thickness))
+        start = max(start, b)
+    return tuple(sections)
+
+
+def _sample_offsets(samples):
+    return (np.arange(samples) + 0.5) / samples - 0.5
+
+
+def _subcell_mask(shapes, shape, samples, cell, origin):
+    """(ny, samples, nx, samples) bool: which sample points of every cell lie inside any shape."""
+    ny, nx = shape
+    dx, dy = cell
+    offsets = _sample_offsets(samples)
+    inside = np.zeros((ny, samples, nx, samples), dtype=bool)
+    for s in shapes:
+        xmin, ymin, xmax, ymax = s.bounds()
+        # cells whose extent overlaps the bounding box
+        j0 = max(0, int(np.floor((xmin - origin[0]) / dx - 0.5)))
+        j1 = min(nx, int(np.ceil((xmax - origin[0]) / dx + 0.5)) + 1)
+        i0 = max(0, int(np.floor((ymin - origin[1]) / dy - 0.5)))
+        i1 = min(ny, int(np.ceil((ymax - origin[1]) / dy + 0.5)) + 1)
+        if j0 >= j1 or i0 >= i1:
+            continue
+        x = origin[0] + (np.arange(j0, j1)[:, None] + offsets[None, :]) * dx  # (nj, samples)
+        y = origin[1] + (np.arange(i0, i1)[:, None] + offsets[None, :]) * dy  # (ni, samples)
+        inside[i0:i1, :, j0:j1, :] |= s.contains(x[None, None], y[:, :, None, None])
+    return inside
+
+
+def _key(shapes, shape, cell, origin):
+    shapes = (shapes,) if isinstance(shapes, (Circle, Polygon)) else tuple(shapes)
+    return shapes, tuple(int(n) for n in shape), tuple(float(c) for c in cell), tuple(float(o) for o in origin)
+
+
+def _read_only(a):
+    a.flags.writeable = False
+    return a
+
+
+@lru_cache(maxsize=128)
+def _rasterize(shapes, shape, cell, origin, samples):
+    inside = _subcell_mask(shapes, shape, samples, cell, origin)
+    if samples == 1:
+        return _read_only(inside[:, 0, :, 0].copy())
+    return _read_only(inside.mean(axis=(1, 3)) >= 0.5)
+
+
+def rasterize(shapes, shape, samples=1, cell=(1.0, 1.0), origin=(0.0, 0.0)):
+    """
+    Boolean `(ny, nx)` mask of the cells inside any of `shapes` (one shape or
+    a sequence). With `samples=1` a cell is inside when its centre is; with
+    `samples=s` when at least half of its `s x s` sample points are. The
+    result is cached and read-only: copy it before modifying.
+    """
+    shapes, shape, cell, origin = _key(shapes, shape, cell, origin)
+    return _rasterize(shapes, shape, cell, origin, int(samples))
+
+
+@lru_cache(maxsize=128)
+def _coverage(shapes, shape, cell, origin, samples):
+    inside = _subcell_mask(shapes, shape, samples, cell, origin)
+    return _read_only(inside.mean(axis=(1, 3), dtype=np.float32))
+
+
+def coverage(shapes, shape, samples=4, cell=(1.0, 1.0), origin=(0.0, 0.0)):
+    """
+    Fraction `(ny, nx)` (float32, 0..1) of every cell covered by the union of
+    `shapes`, estimated with `samples x samples` points per cell. Cached and
+    read-only, like `rasterize`.
+    """
+    shapes, shape, cell, origin = _key(shapes, shape, cell, origin)
+    return _coverage(shapes, shape, cell, origin, int(samples))
+
+
+class MaskIndices:
+    """
+    Cells of an obstacle mask (`(ny, nx)` or stacked `(B, ny, nx)`), as index
+    tuples for `field[index]` and flat indices into a C-ordered array of the
+    mask's shape:
+
+    - `obstacle` / `obstacle_flat`: cells inside the obstacles
+    - `fluid` / `fluid_flat`: all other cells
+    - `boundary` / `boundary_flat`: fluid cells with an obstacle neighbour
+      (4-connected), where the no-slip wall is felt
+
+    Only the obstacle cells are computed up front; the others on first use.
+    """
+
+    def __init__(self, mask):
+        self.mask = np.asarray(mask, dtype=bool)
+        self.shape = self.mask.shape
+        self.obstacle_flat = np.flatnonzero(self.mask)
+        self.obstacle = np.unravel_index(self.obstacle_flat, self.shape)
+
+    @cached_property
+    def fluid_flat(self):
+        return np.flatnonzero(~self.mask)
+
+    @cached_property
+    def fluid(self):
+        return np.unravel_index(self.fluid_flat, self.shape)
+
+    @cached_property
+    def boundary_flat(self):
+        mask = self.mask
+        near = np.zeros_like(mask)
+        near[..., 1:, :] |= mask[..., :-1, :]
+        near[..., :-1, :] |= mask[..., 1:, :]
+        near[..., :, 1:] |= mask[..., :, :-1]
+        near[..., :, :-1] |= mask[..., :, 1:]
+        return np.flatnonzero(near & ~mask)
+
+    @cached_property
+    def boundary(self):
+        return np.unravel_index(self.boundary_flat, self.shape)
+
+    @property
+    def n_obstacle(self):
+        return len(self.obstacle_flat)
@@ -0,0 +1,141 @@
+"""
+Background simulation jobs shared by every session of the app.
+
+A `JobQueue` runs functions in a process pool, so simulations neither block
+the session that asked for them nor compete for the GIL of the server.
+Requests for the same function and arguments share one job while it runs,
+and the last finished jobs are kept, so a class moving the same slider
+starts every simulation once:
+
+    queue = JobQueue()
+    job = queue.submit(run_vegetation, 0.5, n_frames=1)   # returns at once
+    while not job.done():
+        bar.progress(job.progress)
+        time.sleep(0.1)
+    run = job.result()
+
+Functions with a `progress` parameter get a callback reporting the completed
+fraction from the worker. Functions are sent to the workers by reference,
+so they must be importable (module level in `pipeline`), and results are
+shared between sessions: treat them as read-only.
+"""
+import hashlib
+import inspect
+import multiprocessing
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+#: finished jobs kept for later requests
+FINISHED_JOBS = 128
+
+# Worker side
+_progress_queue = None
+_job_key = None
+_last_reported = 0.0
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _report_progress(fraction):
+    """Progress callback in the worker; sends at most one update per percent."""
+    global _last_reported
+    if fraction - _last_reported >= 0.01 or fraction >= 1.0:
+        _last_reported = fraction
+        _progress_queue.put((_job_key, fraction))
+
+
+def _run_job(key, fn, args, kwargs, with_progress):
+    global _job_key, _last_reported
+    _job_key, _last_reported = key, 0.0
+    if with_progress:
+        kwargs = dict(kwargs, progress=_report_progress)
+    return fn(*args, **kwargs)
+
+
+def job_key(fn, args=(), kwargs=None):
+    """Hash of a request: the function's qualified name and the `repr` of its arguments."""
+    request = (fn.__module__, fn.__qualname__, args, sorted((kwargs or {}).items()))
+    return hashlib.sha256(repr(request).encode()).hexdigest()
+
+
+class Job:
+    """One (possibly shared) request: `progress` (0..1), `done()` and `result(timeout)`."""
+
+    def __init__(self, key, future):
+        self.key = key
+        self.future = future
+        self.progress = 0.0
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """The function's return value (waiting up to `timeout` seconds); re-raises its exception."""
+        return self.future.result(timeout)
+
+
+class JobQueue:
+    """
+    Process pool with request deduplication; see the module docstring.
+    `stats` counts the jobs 'started' and the requests 'shared' with a
+    running or finished job.
+    """
+
+    def __init__(self, max_workers=None, finished_jobs=FINISHED_JOBS):
+        context = multiprocessing.get_context('spawn')
+        self._progress = context.SimpleQueue()
+        self._executor = ProcessPoolExecutor(max_workers, mp_context=context, initializer=_init_worker,
+                                             initargs=(self._progress,))
+        self._lock = threading.Lock()
+        self._running = {}
+        self._finished = OrderedDict()
+        self.finished_jobs = finished_jobs
+        self.stats = Counter()
+        self._listener = threading.Thread(target=self._listen, name='job-progress', daemon=True)
+        self._listener.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """`Job` computing `fn(*args, **kwargs)`: the running or finished one for the same request, or a new one."""
+        key = job_key(fn, args, kwargs)
+        with self._lock:
+            job = self._running.get(key)
+            if job is None and key in self._finished:
+                job = self._finished[key]
+                self._finished.move_to_end(key)
+            if job is not None:
+                self.stats['shared'] += 1
+                return job
+            with_progress = 'progress' in inspect.signature(fn).parameters
+            job = Job(key, self._executor.submit(_run_job, key, fn, args, kwargs, with_progress))
+            self._running[key] = job
+            self.stats['started'] += 1
+        job.future.add_done_callback(lambda future: self._finish(job))
+        return job
+
+    def _finish(self, job):
+        with self._lock:
+            self._running.pop(job.key, None)
+            # Failed jobs are not kept, so the next request retries
+            if not job.future.cancelled() and job.future.exception() is None:
+                job.progress = 1.0
+                self._finished[job.key] = job
+                while len(self._finished) > self.finished_jobs:
+                    self._finished.popitem(last=False)
+
+    def _listen(self):
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            key, fraction = message
+            job = self._running.get(key)
+            if job is not None:
+                job.progress = max(job.progress, fraction)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._progress.put(None)
@@ -0,0 +1,98 @@
+"""
+Optional Numba backend for the 2D Burgers step.
+
+Importing this module requires `numba`; `pipeline.solver` falls back to the
+NumPy kernels when it is missing.
+"""
+import numba
+import numpy as np
+
+
+@numba.njit(parallel=True, cache=True)
+def fused_burgers_step(u, v, u_out, v_out, mask, dx, dy, nu, dt, lo, hi):
+    """
+    One explicit step for stacked fields of shape (B, N, K): diffusion, upwind
+    advection and the obstacle no-slip mask in a single pass over the cells
+    of rows `lo:hi`, parallel over rows. Neighbours wrap around (periodic
+    halo), like np.roll. `mask` has shape (1, N, K) (shared) or (B, N, K).
+    """
+    B, N, K = u.shape
+    cx = nu / dx ** 2
+    cy = nu / dy ** 2
+    shared_mask = mask.shape[0] == 1
+    rows = hi - lo
+    for row in numba.prange(B * rows):
+        b = row // rows
+        i = lo + row % rows
+        mb = 0 if shared_mask else b
+        im = i - 1 if i > 0 else N - 1
+        ip = i + 1 if i < N - 1 else 0
+        for j in range(K):
+            if mask[mb, i, j]:
+                u_out[b, i, j] = 0.0
+                v_out[b, i, j] = 0.0
+                continue
+            jm = j - 1 if j > 0 else K - 1
+            jp = j + 1 if j < K - 1 else 0
+
+            uc = u[b, i, j]
+            vc = v[b, i, j]
+            u_xm, u_xp, u_ym, u_yp = u[b, i, jm], u[b, i, jp], u[b, im, j], u[b, ip, j]
+            v_xm, v_xp, v_ym, v_yp = v[b, i, jm], v[b, i, jp], v[b, im, j], v[b, ip, j]
+
+            if uc > 0:
+                u_adv_x = (uc - u_xm) / dx
+                v_adv_x = (vc - v_xm) / dx
+            else:
+                u_adv_x = (u_xp - uc) / dx
+                v_adv_x = (v_xp - vc) / dx
+            if vc > 0:
+                u_adv_y = (uc - u_ym) / dy
+                v_adv_y = (vc - v_ym) / dy
+            else:
+                u_adv_y = (u_yp - uc) / dy
+                v_adv_y = (v_yp - vc) / dy
+
+            u_lap = cx * (u_xm - 2 * uc + u_xp) + cy * (u_ym - 2 * uc + u_yp)
+            v_lap = cx * (v_xm - 2 * vc + v_xp) + cy * (v_ym - 2 * vc + v_yp)
+
+            u_out[b, i, j] = uc + dt * (-uc * u_adv_x - vc * u_adv_y + u_lap)
+            v_out[b, i, j] = vc + dt * (-uc * v_adv_x - vc * v_adv_y + v_lap)
+
+
+class NumbaKernel:
+    """
+    Compiled kernel: the whole step is one fused, multi-threaded loop writing
+    into a second pair of buffers, which are then swapped with the current
+    ones. The obstacle mask is applied inside the loop. `advance_rows` only
+    computes a band of rows and copies it back, so the rows outside it keep
+    their current values.
+    """
+    name = 'numba'
+    fuses_mask = True
+    implicit_diffusion = False
+
+    def __init__(self, shape, dx, dy, mask=None, fixed_edges=()):
+        self.dx, self.dy = dx, dy
+        self.u, self.v, self._u_out, self._v_out = (np.zeros(shape) for _ in range(4))
+        stacked = (-1,) + shape[-2:]
+        if mask is None:
+            self._mask = np.zeros((1,) + shape[-2:], dtype=bool)
+        else:
+            self._mask = np.ascontiguousarray(mask, dtype=bool).reshape(stacked)
+        self._stacked = stacked
+
+    def _step(self, nu, dt, lo, hi):
+        fused_burgers_step(self.u.reshape(self._stacked), self.v.reshape(self._stacked),
+                           self._u_out.reshape(self._stacked), self._v_out.reshape(self._stacked),
+                           self._mask, self.dx, self.dy, nu, dt, lo, hi)
+
+    def advance(self, nu, dt):
+        self._step(nu, dt, 0, self.u.shape[-2])
+        self.u, self._u_out = self._u_out, self.u
+        self.v, self._v_out = self._v_out, self.v
+
+    def advance_rows(self, nu, dt, lo, hi):
+        self._step(nu, dt, lo, hi)
+        self.u[..., lo:hi, :] = self._u_out[..., lo:hi, :]
+        self.v[..., lo:hi, :] = self._v_out[..., lo:hi, :]
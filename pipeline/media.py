@@ -0,0 +1,135 @@
+"""
+Smaller delivery variants of the app's images and animations.
+
+For every GIF/PNG in the data directory this writes WebP (animated for GIFs)
+and, when ffmpeg is on the PATH, H.264 MP4 copies at each width in
+`VARIANT_WIDTHS` into `<data>/variants/`, and lists them under "variants" in
+the manifest so the app can pick the smallest one that fits the client. The
+original files stay as the fallback.
+
+    python -m pipeline.media
+"""
+import argparse
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+
+from PIL import Image, ImageSequence
+
+from pipeline.sweep import load_manifest, save_manifest
+
+VARIANT_WIDTHS = (480, 960)
+VARIANTS_DIR = 'variants'
+SOURCE_PATTERNS = ('*.gif', '*.png')
+
+
+def file_digest(path):
+    """SHA-1 of a file's contents; variants are rebuilt (and ignored by the app) when it changes."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _scaled_size(size, width):
+    """Size fitted to `width` (never enlarged), height rounded to even for the video encoder."""
+    w, h = size
+    if w <= width:
+        return w, h - h % 2
+    return width, max(2, round(h * width / w / 2) * 2)
+
+
+def write_webp(src, dst, width, quality=75):
+    """WebP copy of `src` at most `width` pixels wide; animated GIFs keep their frames and timing."""
+    with Image.open(src) as image:
+        size = _scaled_size(image.size, width)
+        if getattr(image, 'is_animated', False):
+            frames, durations = [], []
+            for frame in ImageSequence.Iterator(image):
+                durations.append(frame.info.get('duration', 100))
+                frames.append(frame.convert('RGB').resize(size, Image.Resampling.LANCZOS))
+            frames[0].save(dst, 'WEBP', save_all=True, append_images=frames[1:], duration=durations,
+                           loop=image.info.get('loop', 0), quality=quality, method=4)
+        else:
+            frame = image.convert('RGBA' if 'A' in image.getbands() else 'RGB').resize(size, Image.Resampling.LANCZOS)
+            # Few colours (diagrams, QR codes) stay sharp losslessly
+            lossless = frame.getcolors(256) is not None
+            frame.save(dst, 'WEBP', quality=quality, lossless=lossless, method=4)
+        return size
+
+
+def write_mp4(src, dst, width, crf=28):
+    """H.264 MP4 copy of an animated `src` via ffmpeg; returns the size, or None if ffmpeg is missing."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    with Image.open(src) as image:
+        size = _scaled_size(image.size, width)
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-i', src,
+                    '-vf', f'scale={size[0]}:{size[1]}:flags=lanczos,format=yuv420p',
+                    '-c:v', 'libx264', '-crf', str(crf), '-movflags', '+faststart', '-an', dst], check=True)
+    return size
+
+
+def build_variants(src, out_dir, widths=VARIANT_WIDTHS):
+    """Write all variants of one file; returns their manifest entries (paths relative to the data directory)."""
+    name = os.path.splitext(os.path.basename(src))[0]
+    with Image.open(src) as image:
+        animated = getattr(image, 'is_animated', False)
+        source_width = image.width
+    # one variant per requested width below the original, plus one at full width
+    widths = sorted({w for w in widths if w < source_width} | {source_width})
+    entries = []
+    for width in widths:
+        outputs = [('webp', write_webp)] + ([('mp4', write_mp4)] if animated else [])
+        for fmt, write in outputs:
+            dst = os.path.join(out_dir, f'{name}_{width}.{fmt}')
+            size = write(src, dst, width)
+            if size is None:
+                continue
+            entries.append({
+                'path': os.path.relpath(dst, os.path.dirname(out_dir)),
+                'format': fmt,
+                'width': size[0],
+                'height': size[1],
+                'bytes': os.path.getsize(dst),
+            })
+    return entries
+
+
+def build_all(data_dir='data', widths=VARIANT_WIDTHS, force=False):
+    """Build the variants of every image/animation in `data_dir` that changed since the last build."""
+    out_dir = os.path.join(data_dir, VARIANTS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(data_dir)
+    variants = manifest.setdefault('variants', {})
+    sources = sorted(p for pattern in SOURCE_PATTERNS for p in glob.glob(os.path.join(data_dir, pattern)))
+    for src in sources:
+        name = os.path.splitext(os.path.basename(src))[0]
+        digest = file_digest(src)
+        entry = variants.get(name)
+        if (not force and entry is not None and entry['source_sha1'] == digest
+                and all(os.path.exists(os.path.join(data_dir, f['path'])) for f in entry['files'])):
+            continue
+        files = build_variants(src, out_dir, widths)
+        variants[name] = {'source': os.path.basename(src), 'source_sha1': digest,
+                          'source_bytes': os.path.getsize(src), 'files': files}
+        save_manifest(manifest, data_dir)
+        smallest = min(f['bytes'] for f in files)
+        print(f"{name}: {os.path.getsize(src) / 1e6:.2f} MB -> {len(files)} variants, "
+              f"smallest {smallest / 1e3:.0f} kB")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build WebP/MP4 variants of the app images and animations.")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--widths', type=int, nargs='+', default=VARIANT_WIDTHS)
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the source did not change")
+    args = parser.parse_args()
+    if shutil.which('ffmpeg') is None:
+        print("ffmpeg not found: building WebP variants only.")
+    build_all(args.data_dir, args.widths, args.force)
@@ -0,0 +1,242 @@
+"""
+Two-level nested grid: a fine patch around the obstacles inside the coarse
+grid of the whole domain.
+
+    patch = patch_around(shapes, grid.shape, ratio=4, margin=6)
+    solver = NestedBurgers2D(grid, nu, dt, patch, bcs=bcs, obstacles=shapes)
+
+Every coarse step is followed by as many fine steps (at the fine grid's
+stable dt) as it takes to catch up. The outermost ring of fine cells is
+set from the coarse solution, interpolated bilinearly in space and linearly
+in time over the coarse step. The coarse cells inside the patch (all but
+its outermost coarse ring) are then replaced by the average of the fine
+cells covering them, which preserves the total momentum of the patch. The
+solver works on the advective form of the equations, so there are no face
+fluxes to match between the two levels beyond that.
+
+The obstacles are rasterized at both resolutions from the same shapes (see
+`pipeline.geometry`, coarse cell coordinates), so the fine patch sees their
+outline `ratio` times more sharply.
+"""
+from collections import namedtuple
+from math import ceil
+
+import numpy as np
+
+from pipeline.geometry import Circle, Polygon, rasterize
+from pipeline.profiling import count
+from pipeline.solver import _EDGES, Burgers2D, Grid2D, TimeStepper
+
+
+class Patch(namedtuple('Patch', 'i0 i1 j0 j1 ratio')):
+    """Rows `i0:i1` and columns `j0:j1` of the coarse grid, refined `ratio` times in both directions."""
+
+    __slots__ = ()
+
+    @property
+    def shape(self):
+        """Shape of the fine grid."""
+        return (self.i1 - self.i0) * self.ratio, (self.j1 - self.j0) * self.ratio
+
+    def grid(self, coarse):
+        """The fine `Grid2D` of this patch in the coarse grid `coarse`."""
+        ny, nx = self.shape
+        return Grid2D(nx, ny, coarse.dx / self.ratio, coarse.dy / self.ratio)
+
+    def fine_centres(self):
+        """`(x, y)` of the fine cell centres in coarse cell coordinates (coarse centres at integers)."""
+        ny, nx = self.shape
+        x = self.j0 - 0.5 + (np.arange(nx) + 0.5) / self.ratio
+        y = self.i0 - 0.5 + (np.arange(ny) + 0.5) / self.ratio
+        return x, y
+
+
+def _members(obstacles):
+    """Obstacles as one tuple of shapes per member, and whether they were given per member."""
+    obstacles = list(obstacles)
+    if obstacles and not isinstance(obstacles[0], (Circle, Polygon)):
+        return [tuple(shapes) for shapes in obstacles], True
+    return [tuple(obstacles)], False
+
+
+def patch_around(obstacles, shape, ratio=2, margin=4):
+    """
+    Smallest `Patch` of the coarse grid `shape` holding every obstacle plus
+    `margin` coarse cells (kept one cell away from the domain edges, where
+    the bilinear interpolation needs a coarse neighbour).
+    """
+    ny, nx = shape
+    members, _ = _members(obstacles)
+    bounds = np.array([s.bounds() for shapes in members for s in shapes])
+    if bounds.size == 0:
+        raise ValueError("No obstacles to refine around")
+    xmin, ymin = bounds[:, :2].min(axis=0)
+    xmax, ymax = bounds[:, 2:].max(axis=0)
+    return Patch(max(1, int(np.floor(ymin)) - margin), min(ny - 1, int(np.ceil(ymax)) + 1 + margin),
+                 max(1, int(np.floor(xmin)) - margin), min(nx - 1, int(np.ceil(xmax)) + 1 + margin), int(ratio))
+
+
+class _Bilinear:
+    """Bilinear interpolation of coarse fields at fixed points given in coarse cell coordinates."""
+
+    def __init__(self, x, y):
+        x, y = np.broadcast_arrays(x, y)
+        j, i = np.floor(x).astype(np.intp), np.floor(y).astype(np.intp)
+        wx, wy = x - j, y - i
+        self.index = [(Ellipsis, i, j), (Ellipsis, i, j + 1), (Ellipsis, i + 1, j), (Ellipsis, i + 1, j + 1)]
+        self.weights = [(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx]
+
+    def __call__(self, f):
+        return sum(w * f[index] for index, w in zip(self.index, self.weights))
+
+
+class _CoarseFineEdge:
+    """
+    Edge condition of the fine patch: the outermost fine cells on `edge`
+    follow the coarse solution, interpolated in time with the parent's
+    current sub-step fraction.
+    """
+
+    def __init__(self, parent, edge, points):
+        self.parent = parent
+        self.edge = edge
+        self.interpolate = _Bilinear(*points)
+        self.start = self.end = None
+
+    def update(self, coarse):
+        """Move to the next coarse step: the current end values become the start values."""
+        self.start = self.end
+        self.end = (self.interpolate(coarse.u), self.interpolate(coarse.v))
+
+    def apply(self, u, v, t):
+        theta = self.parent.theta
+        index = _EDGES[self.edge]
+        for f, start, end in zip((u, v), self.start, self.end):
+            f[index] = start + theta * (end - start)
+
+
+class NestedBurgers2D(TimeStepper):
+    """
+    2D Burgers solver on a coarse grid with one fine `Patch`; see the module
+    docstring.
+
+    Parameters
+    ----------
+    grid, nu, dt, bcs, u0, v0, kernel, batch
+        As for `Burgers2D`, for the coarse grid. The edge conditions apply
+        to the coarse grid only (the patch stays inside the domain).
+    patch : Patch
+        Refined region, at least one coarse cell away from every edge.
+    obstacles : sequence of shapes, or one sequence per member
+        Obstacle geometry in coarse cell coordinates, rasterized onto both
+        grids. Per-member sequences make an ensemble, like a stacked mask.
+    safety : float
+        Safety factor of the fine sub-steps (see `Burgers2D.stable_dt`).
+    """
+
+    def __init__(self, grid, nu, dt, patch, bcs=(), obstacles=(), u0=0.0, v0=0.0, kernel='auto', batch=None,
+                 safety=0.9):
+        i0, i1, j0, j1, r = patch
+        if i0 < 1 or j0 < 1 or i1 > grid.ny - 1 or j1 > grid.nx - 1 or i1 - i0 < 3 or j1 - j0 < 3:
+            raise ValueError(f"{patch} must span at least 3 cells and stay inside {grid}")
+        self.patch = patch
+        self.safety = safety
+        members, stacked = _members(obstacles)
+        coarse_masks = np.array([rasterize(shapes, grid.shape) for shapes in members])
+        # The coarse cells under the patch interior are overwritten by the fine average
+        self._covered = (Ellipsis, slice(i0 + 1, i1 - 1), slice(j0 + 1, j1 - 1))
+        coarse_masks[self._covered] = False
+        self.fine_grid = patch.grid(grid)
+        centres = patch.fine_centres()
+        fine_masks = np.array([rasterize(shapes, patch.shape, cell=(1 / r, 1 / r), origin=(centres[0][0], centres[1][0]))
+                               for shapes in members])
+        if not stacked:
+            coarse_masks, fine_masks = coarse_masks[0], fine_masks[0]
+        self.coarse = Burgers2D(grid, nu, dt, bcs=bcs, mask=coarse_masks, u0=u0, v0=v0, kernel=kernel, batch=batch)
+
+        x, y = centres
+        self._edges = [_CoarseFineEdge(self, 'bottom', (x, y[0])), _CoarseFineEdge(self, 'top', (x, y[-1])),
+                       _CoarseFineEdge(self, 'left', (x[0], y)), _CoarseFineEdge(self, 'right', (x[-1], y))]
+        self.fine = Burgers2D(self.fine_grid, nu, dt, bcs=self._edges, mask=fine_masks, kernel=kernel,
+                              batch=self.coarse.batch)
+        prolong = _Bilinear(x[None, :], y[:, None])
+        self.fine.u[...] = prolong(self.coarse.u)
+        self.fine.v[...] = prolong(self.coarse.v)
+        if self.fine.cells is not None:
+            self.fine.u[self.fine.cells.obstacle] = 0.0
+            self.fine.v[self.fine.cells.obstacle] = 0.0
+        for edge in self._edges:
+            edge.update(self.coarse)
+        self.theta = 1.0
+        self.t = 0.0
+        self.n_steps = 0
+
+    grid = property(lambda self: self.coarse.grid)
+    dt = property(lambda self: self.coarse.dt)
+    batch = property(lambda self: self.coarse.batch)
+    mask = property(lambda self: self.coarse.mask)
+    u = property(lambda self: self.coarse.u)
+    v = property(lambda self: self.coarse.v)
+    shape = property(lambda self: self.coarse.shape)
+    magnitude = property(lambda self: self.coarse.magnitude)
+
+    def stable_dt(self, safety=0.9):
+        """Stable step of the coarse grid; the patch sub-steps on its own."""
+        return self.coarse.stable_dt(safety)
+
+    def checkpoint(self):
+        """State of both grids (see `TimeStepper.checkpoint`), keys prefixed with 'coarse_' / 'fine_'."""
+        state = {f'{name}_{key}': value for name, grid in (('coarse', self.coarse), ('fine', self.fine))
+                 for key, value in grid.checkpoint().items()}
+        state.update(t=np.float64(self.t), n_steps=np.int64(self.n_steps))
+        return state
+
+    def restore(self, state):
+        for name, grid in (('coarse', self.coarse), ('fine', self.fine)):
+            prefix = name + '_'
+            grid.restore({key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)})
+        # The patch edges interpolate from the coarse state at the end of the last step
+        for edge in self._edges:
+            edge.update(self.coarse)
+        self.theta = 1.0
+        self.t = float(state['t'])
+        self.n_steps = int(state['n_steps'])
+
+    def _restrict(self, f_coarse, f_fine):
+        r = self.patch.ratio
+        interior = f_fine[..., r:-r, r:-r]
+        ny, nx = interior.shape[-2] // r, interior.shape[-1] // r
+        f_coarse[self._covered] = interior.reshape(interior.shape[:-2] + (ny, r, nx, r)).mean(axis=(-3, -1))
+
+    def step(self, dt=None):
+        """One coarse step, the fine sub-steps over the same interval, then the fine average onto the coarse grid."""
+        dt = self.coarse.dt if dt is None else dt
+        self.coarse.step(dt)
+        for edge in self._edges:
+            edge.update(self.coarse)
+        n_sub = max(1, ceil(dt / self.fine.stable_dt(self.safety)))
+        for k in range(n_sub):
+            self.theta = (k + 1) / n_sub
+            self.fine.step(dt / n_sub)
+        count('fine_steps', n_sub)
+        self._restrict(self.coarse.u, self.fine.u)
+        self._restrict(self.coarse.v, self.fine.v)
+        self.n_steps += 1
+        self.t += dt
+
+    def composite(self, coarse, fine):
+        """
+        Whole-domain array at the fine resolution: the coarse field `coarse`
+        repeated `ratio` times along both axes, with the patch taken from
+        `fine`, e.g. `composite(solver.magnitude, solver.fine.magnitude)`.
+        """
+        i0, i1, j0, j1, r = self.patch
+        out = np.repeat(np.repeat(coarse, r, axis=-2), r, axis=-1)
+        out[..., i0 * r:i1 * r, j0 * r:j1 * r] = fine
+        return out
+
+    @property
+    def composite_grid(self):
+        """`Grid2D` of `composite` arrays."""
+        g, r = self.grid, self.patch.ratio
+        return Grid2D(g.nx * r, g.ny * r, g.dx / r, g.dy / r)
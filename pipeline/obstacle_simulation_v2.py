@@ -1,191 +1,219 @@
-import numpy as np
+import argparse
+from contextlib import ExitStack
+
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+import numpy as np
+
+from pipeline.cache import CACHE_DIR, ResultCache
+from pipeline.nested import NestedBurgers2D, patch_around
+from pipeline.obstacles import OBSTACLE_TYPES, stacked_layout_masks, triple_layout_shapes
+from pipeline.profiling import profiled
+from pipeline.render import HeatmapRenderer
+from pipeline.solver import Burgers2D, Dirichlet, Grid2D, Neumann, SteadyState
+from pipeline.streaming import FigureStream, GifStreamWriter
 
 # --- Simulation Parameters ---
 K = 100  # Grid size in X axis (width)
 N = 100  # Grid size in Y axis (height)
 L_x = 4.0  # Domain length in X
 L_y = 10.0  # Domain length in Y
-dx = L_x / K  # Grid spacing in X
-dy = L_y / N  # Grid spacing in Y
 dt = 0.01  # Time step (reduced for stability)
 T = 5.0  # Total simulation time
 nu = 0.05  # Viscosity
+u_flow_speed = 1.0
+STEADY_TOL = 1e-3  # stop once no sampled velocity changes faster than this (per unit time, RMS)
+LAYOUTS = 3  # single, pair, triangle formation
+# Modules behind a triple run, besides the solver (see `pipeline.cache`)
+CACHE_MODULES = ('obstacle_simulation_v2.py', 'obstacles.py', 'nested.py')
 
 
-# --- Helper function to create obstacles ---
-def create_obstacle_mask(shape, K, N, center_x, center_y, size_param):
+def make_triple_solver(obstacle_types, K=K, N=N, L_x=L_x, L_y=L_y, dt=dt, nu=nu, u_flow_speed=u_flow_speed,
+                       refine=1, margin=6):
     """
-    Creates a boolean mask for a given obstacle shape.
-    size_param is interpreted as half_size, radius, etc. depending on the shape.
+    One batched solver advancing all three obstacle layouts for every type in
+    `obstacle_types`; member `3 * i + j` is layout `j` of `obstacle_types[i]`.
+    With `refine > 1` the obstacles (plus `margin` cells) sit in a patch that
+    is `refine` times finer (`NestedBurgers2D`).
     """
-    mask = np.zeros((N, K), dtype=bool)
-
-    if shape == 'square':
-        half_size = int(N * size_param)
-        mask[center_y - half_size: center_y + half_size,
-        center_x - half_size: center_x + half_size] = True
-    elif shape == 'rectangle':
-        rect_height_half = int(N * size_param * 1.5)  # Make it taller
-        rect_width_half = int(K * size_param * 0.5)  # Make it narrower
-        mask[center_y - rect_height_half: center_y + rect_height_half,
-        center_x - rect_width_half: center_x + rect_width_half] = True
-    elif shape == 'circle':
-        radius = int(N * size_param)
-        y_coords, x_coords = np.ogrid[:N, :K]
-        dist_from_center = np.sqrt((x_coords - center_x) ** 2 + (y_coords - center_y) ** 2)
-        mask[dist_from_center <= radius] = True
-    elif shape == 'triangle':
-        height = int(N * size_param * 2)
-        half_base_width = int(K * size_param)
-        base_y = center_y - height // 2
-        tip_y = base_y + height
-        for y_coord in range(base_y, tip_y):
-            if y_coord < 0 or y_coord >= N: continue
-            current_half_width = int(half_base_width * (tip_y - y_coord) / height)
-            start_x = max(0, center_x - current_half_width)
-            end_x = min(K, center_x + current_half_width + 1)
-            mask[y_coord, start_x:end_x] = True
-
-    return mask
-
-
-# --- User Controls ---
-obstacle_type = input("Choose obstacle type (square, circle, rectangle, triangle, or none): ")
-
-# --- Initialize THREE sets of velocity fields ---
-u_flow_speed = 1.0
-# Simulation 1 (Left subplot)
-u1 = np.zeros((N, K))
-v1 = np.ones((N, K)) * u_flow_speed
-# Simulation 2 (Middle subplot)
-u2 = np.zeros((N, K))
-v2 = np.ones((N, K)) * u_flow_speed
-# Simulation 3 (Right subplot)
-u3 = np.zeros((N, K))
-v3 = np.ones((N, K)) * u_flow_speed
-
-# --- Define Obstacles for all simulations ---
-# Mask 1: Single obstacle in the center
-center_y_single = N // 2
-mask1 = create_obstacle_mask(obstacle_type, K, N, center_x=K // 2, center_y=center_y_single, size_param=0.1)
-
-# Mask 2: Two obstacles side-by-side
-size_for_two = 0.08
-mask2a = create_obstacle_mask(obstacle_type, K, N, center_x=K // 4, center_y=center_y_single, size_param=size_for_two)
-mask2b = create_obstacle_mask(obstacle_type, K, N, center_x=3 * K // 4, center_y=center_y_single,
-                              size_param=size_for_two)
-mask2 = np.logical_or(mask2a, mask2b)
-
-# Mask 3: Three obstacles in a triangle formation
-size_for_three = 0.08
-top_y = N // 2 + N // 10
-bottom_y = N // 2 - N // 10
-mask3a = create_obstacle_mask(obstacle_type, K, N, center_x=K // 4, center_y=top_y, size_param=size_for_three)
-mask3b = create_obstacle_mask(obstacle_type, K, N, center_x=3 * K // 4, center_y=top_y, size_param=size_for_three)
-mask3c = create_obstacle_mask(obstacle_type, K, N, center_x=K // 2, center_y=bottom_y, size_param=size_for_three)
-mask3 = np.logical_or.reduce([mask3a, mask3b, mask3c])
-
-if obstacle_type == 'none':
-    mask1.fill(False)
-    mask2.fill(False)
-    mask3.fill(False)
-
-# --- Setup the plot for three subplots ---
-fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(20, 7))
-ims = []
-
-print(f"Starting simulation for {T / dt:.0f} steps...")
-
-# --- Main Simulation Loop ---
-for t_step in range(int(T / dt)):
-    sim_data = [(u1, v1), (u2, v2), (u3, v3)]
-    new_data = []
-
-    # Process all three simulations
-    for u, v in sim_data:
-        u_xx = (np.roll(u, 1, axis=1) - 2 * u + np.roll(u, -1, axis=1)) / dx ** 2
-        u_yy = (np.roll(u, 1, axis=0) - 2 * u + np.roll(u, -1, axis=0)) / dy ** 2
-        v_xx = (np.roll(v, 1, axis=1) - 2 * v + np.roll(v, -1, axis=1)) / dx ** 2
-        v_yy = (np.roll(v, 1, axis=0) - 2 * v + np.roll(v, -1, axis=0)) / dy ** 2
-
-        u_adv_x = np.where(u > 0, (u - np.roll(u, 1, axis=1)) / dx, (np.roll(u, -1, axis=1) - u) / dx)
-        u_adv_y = np.where(v > 0, (u - np.roll(u, 1, axis=0)) / dy, (np.roll(u, -1, axis=0) - u) / dy)
-        v_adv_x = np.where(u > 0, (v - np.roll(v, 1, axis=1)) / dx, (np.roll(v, -1, axis=1) - v) / dx)
-        v_adv_y = np.where(v > 0, (v - np.roll(v, 1, axis=0)) / dy, (np.roll(v, -1, axis=0) - v) / dy)
-
-        u_new = u + dt * (-u * u_adv_x - v * u_adv_y + nu * (u_xx + u_yy))
-        v_new = v + dt * (-u * v_adv_x - v * v_adv_y + nu * (v_xx + v_yy))
-        new_data.append((u_new, v_new))
-
-    # Apply Boundary Conditions and Obstacles to all simulations
-    masks = [mask1, mask2, mask3]
-    for i in range(3):
-        u_new, v_new = new_data[i]
-        mask = masks[i]
-
+    grid = Grid2D.from_lengths(L_x, L_y, K, N)
+    bcs = [
         # Neumann BCs on left/right walls
-        u_new[:, 0], u_new[:, -1] = u_new[:, 1], u_new[:, -2]
-        v_new[:, 0], v_new[:, -1] = v_new[:, 1], v_new[:, -2]
-        # Dirichlet BCs on bottom wall
-        u_new[-1, :], v_new[-1, :] = np.zeros(K), np.ones(K)
-
-        # Obstacle no-slip condition
-        u_new[mask], v_new[mask] = 0, 0
-
-    # Update state variables
-    u1, v1 = new_data[0]
-    u2, v2 = new_data[1]
-    u3, v3 = new_data[2]
-
-    # --- Add frame to animation ---
-    if t_step % 10 == 0:
-        mag1 = np.sqrt(u1 ** 2 + v1 ** 2)
-        mag2 = np.sqrt(u2 ** 2 + v2 ** 2)
-        mag3 = np.sqrt(u3 ** 2 + v3 ** 2)
-
-        common_vmax = u_flow_speed * 1.5
-
-        img1 = ax1.imshow(mag1, origin='lower', extent=[0, L_x, 0, L_y], animated=True, cmap='Blues_r', vmin=0,
-                          vmax=common_vmax)
-        img2 = ax2.imshow(mag2, origin='lower', extent=[0, L_x, 0, L_y], animated=True, cmap='Blues_r', vmin=0,
-                          vmax=common_vmax)
-        img3 = ax3.imshow(mag3, origin='lower', extent=[0, L_x, 0, L_y], animated=True, cmap='Blues_r', vmin=0,
-                          vmax=common_vmax)
-
-        if t_step == 0:
-            ax1.imshow(mask1, origin='lower', extent=[0, L_x, 0, L_y], cmap='gray', alpha=0.6)
-            ax2.imshow(mask2, origin='lower', extent=[0, L_x, 0, L_y], cmap='gray', alpha=0.6)
-            ax3.imshow(mask3, origin='lower', extent=[0, L_x, 0, L_y], cmap='gray', alpha=0.6)
-
-            ax1.set_title(f'Flow with 1 "{obstacle_type}" obstacle')
-            ax2.set_title(f'Flow with 2 "{obstacle_type}" obstacles')
-            ax3.set_title(f'Flow with 3 "{obstacle_type}" obstacles')
-
-            for ax in [ax1, ax2, ax3]:
-                ax.set_xlabel("X Position (m)")
-            ax1.set_ylabel("Y Position (m)")
-
-            fig.colorbar(img3, ax=ax3, label='Velocity Magnitude (m/s)', shrink=0.75)
-
-        ims.append([img1, img2, img3])
-        print(f"Step {t_step}/{int(T / dt)} completed.", end='\r')
-
-print("\nSimulation finished. Creating animation...")
-
-# Create animation
-ani = animation.ArtistAnimation(fig, ims, interval=50, blit=True, repeat_delay=1000)
-
-# Save or show animation
-try:
-    save_filename = f'flow_animation_triple_{obstacle_type}.gif'
-    ani.save(save_filename, writer='imagemagick', fps=15)
-    print(f"Animation saved as {save_filename}")
-except Exception as e:
-    print(f"\nCould not save animation as GIF. Error: {e}")
-    print("This may require 'imagemagick' to be installed on your system.")
-    print("Showing animation in Matplotlib window instead.")
-    plt.show()
-
-print("Program finished.")
\ No newline at end of file
+        Neumann('left'), Neumann('right'),
+        # Dirichlet BCs on the last row
+        Dirichlet('top', u=0.0, v=u_flow_speed),
+    ]
+    if refine > 1:
+        shapes = [layout for obstacle_type in obstacle_types for layout in triple_layout_shapes(obstacle_type, K, N)]
+        patch = patch_around(shapes, grid.shape, ratio=refine, margin=margin)
+        return NestedBurgers2D(grid, nu, dt, patch, bcs=bcs, obstacles=shapes, u0=0.0, v0=u_flow_speed)
+    masks = stacked_layout_masks(obstacle_types, K, N)
+    return Burgers2D(grid, nu, dt, bcs=bcs, mask=masks, u0=0.0, v0=u_flow_speed)
+
+
+def display_magnitude(solver):
+    """Velocity magnitude as drawn: a nested solver is shown at the resolution of its patch everywhere."""
+    if isinstance(solver, NestedBurgers2D):
+        return solver.composite(solver.magnitude, solver.fine.magnitude)
+    return solver.magnitude
+
+
+def display_grid(solver):
+    """Grid of `display_magnitude`."""
+    return solver.composite_grid if isinstance(solver, NestedBurgers2D) else solver.grid
+
+
+def display_mask(solver):
+    """Obstacle mask on `display_grid`."""
+    return solver.composite(solver.mask, solver.fine.mask) if isinstance(solver, NestedBurgers2D) else solver.mask
+
+
+def triple_frames(obstacle_types, T=T, dt=dt, store_every=10, refine=1, steady_tol=STEADY_TOL, cache=None):
+    """
+    `(grid, mask, frames)` of the batched run of `make_triple_solver`: the
+    display grid and obstacle masks, and an iterator over the magnitude
+    (see `display_magnitude`) of every stored frame, computed as it is
+    consumed. The run ends before `T` once every member is steady (or
+    periodic, after one period) to `steady_tol` (see `SteadyState`; None
+    runs to `T`). With a `ResultCache` `cache` the frames are read from it
+    if this run is stored, and stored there (float32) otherwise.
+    """
+    params = dict(obstacle_types=list(obstacle_types), T=T, dt=dt, store_every=store_every, refine=refine,
+                  steady_tol=steady_tol)
+    key = None if cache is None else cache.key('triple_obstacle_flows', params, modules=CACHE_MODULES)
+    stored = None if key is None else cache.get(key)
+    if stored is not None:
+        mask = stored['mask']
+        return Grid2D(mask.shape[-1], mask.shape[-2], *stored['spacing']), mask, iter(stored['magnitude'])
+
+    solver = make_triple_solver(obstacle_types, dt=dt, refine=refine)
+    grid, mask = display_grid(solver), display_mask(solver)
+    steady = None if not steady_tol else SteadyState(steady_tol)
+
+    def frames():
+        kept = []
+        for _ in solver.iter_steps(int(T / dt), store_every, steady=steady):
+            magnitude = display_magnitude(solver)
+            if key is not None:
+                # Cached and fresh runs draw the same float32 frames
+                magnitude = magnitude.astype(np.float32)
+                kept.append(magnitude)
+            yield magnitude
+        if steady is not None:
+            print(f"\n{steady.summary()}")
+        if key is not None:
+            cache.put(key, {'spacing': [grid.dx, grid.dy], 'mask': mask, 'magnitude': np.array(kept)})
+
+    return grid, mask, frames()
+
+
+def simulate_triple_obstacle_flows(obstacle_types, T=T, dt=dt, store_every=10, save_filenames=None,
+                                   renderer='figure', refine=1, steady_tol=STEADY_TOL, cache=None):
+    """
+    Simulate the three layouts of every obstacle type in one batched run and
+    stream one triple-panel animation per type while the solver runs.
+    `renderer='figure'` draws the titled matplotlib figure (blitted);
+    `renderer='heatmap'` writes the bare magnitude panels straight from a
+    colormap lookup table, which is much faster. `refine > 1` resolves the
+    obstacles on a finer nested patch (see `make_triple_solver`). The run
+    stops early once the flows have settled (`steady_tol`), and with a
+    `ResultCache` `cache` a stored run is only drawn again (see
+    `triple_frames`).
+    """
+    grid, mask, frames = triple_frames(obstacle_types, T=T, dt=dt, store_every=store_every, refine=refine,
+                                       steady_tol=steady_tol, cache=cache)
+    n_frames = len(range(0, int(T / dt), store_every))
+    if save_filenames is None:
+        save_filenames = [f'flow_animation_triple_{obstacle_type}.gif' for obstacle_type in obstacle_types]
+    groups = [range(LAYOUTS * i, LAYOUTS * (i + 1)) for i in range(len(obstacle_types))]
+
+    if renderer == 'heatmap':
+        heatmap = HeatmapRenderer('Blues_r', 0, u_flow_speed * 1.5, scale=heatmap_scale(grid))
+        streams = [GifStreamWriter(save_filename, fps=15) for save_filename in save_filenames]
+
+        def draw(magnitude):
+            for members, stream in zip(groups, streams):
+                stream.write(heatmap.image(*(magnitude[m] for m in members)))
+    else:
+        panels = [triple_panel_figure(grid, mask, obstacle_type, members)
+                  for obstacle_type, members in zip(obstacle_types, groups)]
+        streams = [FigureStream(fig, save_filename, fps=15, artists=imgs)
+                   for (fig, imgs), save_filename in zip(panels, save_filenames)]
+
+        def draw(magnitude):
+            for (fig, imgs), members, stream in zip(panels, groups, streams):
+                for img, m in zip(imgs, members):
+                    img.set_data(magnitude[m])
+                stream.grab()
+
+    print(f"Starting simulation of {len(mask)} configurations for up to {n_frames} frames...")
+
+    with ExitStack() as stack:
+        for stream in streams:
+            stack.enter_context(stream)
+
+        # --- Main Simulation Loop: encode each frame as soon as it is computed ---
+        for k, magnitude in enumerate(frames, start=1):
+            draw(magnitude)
+            print(f"Frame {k}/{n_frames} completed.", end='\r')
+
+    print("\nSimulation finished.")
+    for save_filename, stream in zip(save_filenames, streams):
+        print(f"Animation saved as {save_filename} ({stream.n_frames} frames)")
+    if renderer != 'heatmap':
+        for fig, _ in panels:
+            plt.close(fig)
+
+
+def triple_panel_figure(grid, mask, obstacle_type, members):
+    """
+    Figure with one subplot per layout of the `members` of the batched
+    `mask` on `grid`; returns `(fig, imgs)` with the magnitude images to update.
+    """
+    fig, axes = plt.subplots(1, LAYOUTS, figsize=(20, 7))
+    imgs = []
+    for count, (ax, m) in enumerate(zip(axes, members), start=1):
+        ax.imshow(mask[m], origin='lower', extent=grid.extent, cmap='gray', alpha=0.6)
+        imgs.append(ax.imshow(np.zeros(grid.shape), origin='lower', extent=grid.extent, cmap='Blues_r',
+                              vmin=0, vmax=u_flow_speed * 1.5))
+        ax.set_title(f'Flow with {count} "{obstacle_type}" obstacle' + ('s' if count > 1 else ''))
+        ax.set_xlabel("X Position (m)")
+    axes[0].set_ylabel("Y Position (m)")
+    fig.colorbar(imgs[-1], ax=axes[-1], label='Velocity Magnitude (m/s)', shrink=0.75)
+    return fig, imgs
+
+
+def heatmap_scale(grid, pixels=400):
+    """Per-axis `HeatmapRenderer` scale so a panel is about `pixels` wide and cells keep their aspect ratio."""
+    sx = max(1, round(pixels / grid.nx))
+    return max(1, round(sx * grid.dy / grid.dx)), sx
+
+
+def simulate_triple_obstacle_flow(obstacle_type, T=T, dt=dt, store_every=10, save_filename=None, renderer='figure',
+                                  refine=1, steady_tol=STEADY_TOL, cache=None):
+    return simulate_triple_obstacle_flows([obstacle_type], T=T, dt=dt, store_every=store_every,
+                                          save_filenames=None if save_filename is None else [save_filename],
+                                          renderer=renderer, refine=refine, steady_tol=steady_tol, cache=cache)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="River flow around 1, 2 and 3 obstacles (station 3).")
+    parser.add_argument('--obstacle', choices=OBSTACLE_TYPES, nargs='+', default=['circle'],
+                        help="One or more obstacle types, simulated together in one batched run")
+    parser.add_argument('--all', action='store_true', help="Simulate every obstacle type shown in the app")
+    parser.add_argument('--renderer', choices=('figure', 'heatmap'), default='figure',
+                        help="'heatmap' writes bare colormapped panels without matplotlib (fast)")
+    parser.add_argument('--refine', type=int, default=1, metavar='RATIO',
+                        help="Resolve the obstacles on a nested patch RATIO times finer than the grid")
+    parser.add_argument('--t-end', type=float, default=T, help="Simulated time at most")
+    parser.add_argument('--steady-tol', type=float, default=STEADY_TOL,
+                        help="Stop once the flows are steady (or periodic) to this residual (0: run to --t-end)")
+    parser.add_argument('--cache', nargs='?', const=CACHE_DIR, metavar='DIR',
+                        help=f"Reuse the frames of an earlier run from the result cache (default: {CACHE_DIR})")
+    parser.add_argument('--profile', action='store_true', help="Print the time spent per phase at the end")
+    parser.add_argument('--trace', metavar='FILE', help="Also write a Chrome trace of the phases (implies --profile)")
+    args = parser.parse_args()
+    obstacle_types = [t for t in OBSTACLE_TYPES if t != 'none'] if args.all else args.obstacle
+    with profiled(args.profile, args.trace):
+        simulate_triple_obstacle_flows(obstacle_types, T=args.t_end, renderer=args.renderer, refine=args.refine,
+                                       steady_tol=args.steady_tol, cache=None if args.cache is None else ResultCache(args.cache))
+    print("Program finished.")
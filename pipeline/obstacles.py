@@ -0,0 +1,106 @@
+"""
+Obstacle masks for the station 3 river-flow animations.
+"""
+import numpy as np
+
+from pipeline.geometry import Circle, MaskIndices, Rectangle, Triangle, rasterize
+
+OBSTACLE_TYPES = ('circle', 'rectangle', 'square', 'triangle', 'none')
+
+
+def station_obstacle(shape, center_x, center_y, half_width, half_height):
+    """
+    Geometry of one station obstacle in cell coordinates (cell centres at
+    integer positions). Boxes cover the `2 * half` cells from `center - half`
+    on, the circle the cells within `half_width` of the centre, and the
+    triangle points towards +y with its base `half_height` below the centre.
+    Returns None for 'none'.
+    """
+    if shape in ('square', 'rectangle'):
+        return Rectangle(center_x - 0.5, center_y - 0.5, 2 * half_width, 2 * half_height)
+    if shape == 'circle':
+        return Circle(center_x, center_y, half_width)
+    if shape == 'triangle':
+        height = 2 * half_height
+        return Triangle(center_x, center_y - height // 2, half_width, height)
+    if shape == 'none':
+        return None
+    raise ValueError(f"Unknown obstacle {shape!r}, expected one of {OBSTACLE_TYPES}")
+
+
+def layout_shape(shape, K, N, center_x, center_y, size_param):
+    """
+    The station obstacle of `create_obstacle_mask`, where `size_param` is
+    interpreted as half_size, radius, etc. depending on the shape.
+    """
+    if shape == 'square':
+        half = int(N * size_param)
+        return station_obstacle(shape, center_x, center_y, half, half)
+    if shape == 'rectangle':
+        # Taller than wide
+        return station_obstacle(shape, center_x, center_y, int(K * size_param * 0.5), int(N * size_param * 1.5))
+    if shape == 'circle':
+        radius = int(N * size_param)
+        return station_obstacle(shape, center_x, center_y, radius, radius)
+    if shape == 'triangle':
+        return station_obstacle(shape, center_x, center_y, int(K * size_param), int(N * size_param))
+    return station_obstacle(shape, center_x, center_y, 0, 0)
+
+
+def create_obstacle_mask(shape, K, N, center_x, center_y, size_param):
+    """
+    Creates a boolean mask for a given obstacle shape.
+    size_param is interpreted as half_size, radius, etc. depending on the shape.
+    """
+    obstacle = layout_shape(shape, K, N, center_x, center_y, size_param)
+    if obstacle is None:
+        return np.zeros((N, K), dtype=bool)
+    return rasterize(obstacle, (N, K)).copy()
+
+
+def triple_layout_shapes(obstacle_type, K, N):
+    """
+    Obstacles of the three station 3 layouts: a single obstacle in the center,
+    two obstacles side-by-side and three obstacles in a triangle formation.
+    """
+    # Layout 1: Single obstacle in the center
+    center_y_single = N // 2
+    layout1 = [layout_shape(obstacle_type, K, N, center_x=K // 2, center_y=center_y_single, size_param=0.1)]
+
+    # Layout 2: Two obstacles side-by-side
+    size_for_two = 0.08
+    layout2 = [layout_shape(obstacle_type, K, N, center_x=K // 4, center_y=center_y_single, size_param=size_for_two),
+               layout_shape(obstacle_type, K, N, center_x=3 * K // 4, center_y=center_y_single,
+                            size_param=size_for_two)]
+
+    # Layout 3: Three obstacles in a triangle formation
+    size_for_three = 0.08
+    top_y = N // 2 + N // 10
+    bottom_y = N // 2 - N // 10
+    layout3 = [layout_shape(obstacle_type, K, N, center_x=K // 4, center_y=top_y, size_param=size_for_three),
+               layout_shape(obstacle_type, K, N, center_x=3 * K // 4, center_y=top_y, size_param=size_for_three),
+               layout_shape(obstacle_type, K, N, center_x=K // 2, center_y=bottom_y, size_param=size_for_three)]
+
+    return [tuple(s for s in layout if s is not None) for layout in (layout1, layout2, layout3)]
+
+
+def triple_layout_masks(obstacle_type, K, N):
+    """
+    Masks for the three station 3 layouts (see `triple_layout_shapes`). The
+    masks are cached and read-only.
+    """
+    return [rasterize(shapes, (N, K)) for shapes in triple_layout_shapes(obstacle_type, K, N)]
+
+
+def stacked_layout_masks(obstacle_types, K, N):
+    """
+    Masks for every (obstacle type, layout) pair stacked into one `(3 * len(obstacle_types), N, K)`
+    array, ordered type by type: member `3 * i + j` is layout `j` of `obstacle_types[i]`.
+    """
+    return np.stack([mask for obstacle_type in obstacle_types
+                     for mask in triple_layout_masks(obstacle_type, K, N)])
+
+
+def layout_indices(obstacle_types, K, N):
+    """`MaskIndices` (obstacle / fluid / boundary cells) of `stacked_layout_masks`."""
+    return MaskIndices(stacked_layout_masks(obstacle_types, K, N))
@@ -0,0 +1,139 @@
+"""
+Lightweight per-phase timing for the pipeline.
+
+The solver, boundary conditions, frame storage, rendering and encoding report
+into the shared `profiler`:
+
+    with phase('encode'):
+        ...
+    count('bytes_written', n)
+
+Both are no-ops until profiling is switched on, e.g. for one run:
+
+    with profiled(trace_path='run.trace.json'):
+        simulate_...()
+
+which prints the time per phase, steps per second and bytes written at the
+end, and optionally writes every timed interval as a Chrome trace (open it in
+https://ui.perfetto.dev, chrome://tracing or https://www.speedscope.app).
+Phases may nest (e.g. 'boundary' inside 'step'); totals are inclusive.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+_NULL = nullcontext()
+#: trace events kept per run; beyond this only the totals are updated
+MAX_TRACE_EVENTS = 1_000_000
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter_ns())
+
+
+class Profiler:
+    """Registry of phase timers and counters; see the module docstring."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self.reset()
+
+    def reset(self):
+        self.totals = defaultdict(int)  # ns
+        self.calls = Counter()
+        self.counters = Counter()
+        self.events = []
+        self._start = self._stop = time.perf_counter_ns()
+
+    def enable(self, trace=False):
+        self.reset()
+        self.enabled = True
+        self.trace = trace
+
+    def disable(self):
+        self.enabled = False
+        self._stop = time.perf_counter_ns()
+
+    def phase(self, name):
+        """Context manager timing one interval of phase `name`."""
+        return _Phase(self, name) if self.enabled else _NULL
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def _record(self, name, start, stop):
+        self.totals[name] += stop - start
+        self.calls[name] += 1
+        if self.trace and len(self.events) < MAX_TRACE_EVENTS:
+            self.events.append((name, start, stop, threading.get_ident()))
+
+    @property
+    def wall_seconds(self):
+        return ((time.perf_counter_ns() if self.enabled else self._stop) - self._start) / 1e9
+
+    def summary(self):
+        """Table of time per phase (share of the wall time, per call), counters and step rate."""
+        wall = self.wall_seconds
+        lines = [f"{'phase':<16} {'calls':>9} {'total s':>9} {'% wall':>7} {'ms/call':>9}"]
+        for name, ns in sorted(self.totals.items(), key=lambda item: -item[1]):
+            seconds = ns / 1e9
+            lines.append(f"{name:<16} {self.calls[name]:>9} {seconds:>9.3f} {100 * seconds / wall:>6.1f}%"
+                         f" {1e3 * seconds / self.calls[name]:>9.3f}")
+        lines.append(f"{'wall':<16} {'':>9} {wall:>9.3f}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<16} {value:>9}" + (f"  ({value / 1e6:.2f} MB)" if name.startswith('bytes') else ''))
+        if self.counters['steps'] and self.totals['step']:
+            lines.append(f"steps/s          {self.counters['steps'] / (self.totals['step'] / 1e9):>9.1f}"
+                         f"  (stepping only; {self.counters['steps'] / wall:.1f} overall)")
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        """Write the recorded intervals in the Chrome trace event format."""
+        pid = os.getpid()
+        events = [{'name': name, 'cat': 'pipeline', 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self._start) / 1e3, 'dur': (stop - start) / 1e3}
+                  for name, start, stop, tid in self.events]
+        events += [{'name': name, 'ph': 'C', 'pid': pid, 'ts': self.wall_seconds * 1e6, 'args': {name: value}}
+                   for name, value in self.counters.items()]
+        with open(path, 'w') as fp:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+
+
+profiler = Profiler()
+phase = profiler.phase
+count = profiler.count
+
+
+@contextmanager
+def profiled(enabled=True, trace_path=None):
+    """
+    Profile the enclosed code with the shared profiler, then print the summary
+    and write the Chrome trace to `trace_path` (if given).
+    """
+    if not enabled and trace_path is None:
+        yield profiler
+        return
+    profiler.enable(trace=trace_path is not None)
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        print(profiler.summary())
+        if trace_path is not None:
+            profiler.write_trace(trace_path)
+            print(f"Trace written to {trace_path} ({len(profiler.events)} events)")
@@ -0,0 +1,76 @@
+"""
+Direct-to-image rendering of 2D fields.
+
+`HeatmapRenderer` maps a field to colormap indices with one clip/scale pass
+and returns a palette ("P" mode) image whose palette is the colormap itself,
+so frames go straight to `GifStreamWriter` without matplotlib drawing or
+colour quantization. Use it for bare heatmaps; figures with axes, titles
+and colorbars go through `FigureStream` with blitting instead.
+"""
+import numpy as np
+from PIL import Image
+
+from pipeline.profiling import phase
+
+#: palette index reserved for the background between panels
+BACKGROUND = 255
+N_COLORS = 255
+
+
+def colormap_lut(cmap, n=N_COLORS):
+    """(n, 3) uint8 lookup table sampled from a matplotlib colormap (name or object)."""
+    import matplotlib
+
+    if isinstance(cmap, str):
+        cmap = matplotlib.colormaps[cmap]
+    return (cmap(np.linspace(0, 1, n))[:, :3] * 255).round().astype(np.uint8)
+
+
+class HeatmapRenderer:
+    """
+    Turn 2D fields into images with a fixed colour scale, like
+    `imshow(field, cmap=cmap, vmin=vmin, vmax=vmax, origin=origin)`.
+    `scale` repeats every cell (nearest neighbour) to enlarge small grids:
+    an int for both directions or `(rows, cols)`, e.g. to keep the aspect
+    ratio of non-square cells.
+    """
+
+    def __init__(self, cmap, vmin, vmax, origin='lower', scale=1, background=(255, 255, 255)):
+        self.lut = colormap_lut(cmap)
+        self.vmin, self.vmax = vmin, vmax
+        self.origin = origin
+        self.scale = (scale, scale) if np.isscalar(scale) else tuple(scale)
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[:N_COLORS] = self.lut
+        palette[BACKGROUND] = background
+        self.palette = palette.ravel().tolist()
+
+    def indices(self, field):
+        """Palette indices (uint8) of `field`, flipped and enlarged as it is displayed."""
+        idx = np.asarray(field, dtype=np.float32) - self.vmin
+        idx *= (N_COLORS - 1) / (self.vmax - self.vmin)
+        np.clip(idx, 0, N_COLORS - 1, out=idx)
+        idx = idx.astype(np.uint8)
+        if self.origin == 'lower':
+            idx = idx[::-1]
+        if self.scale[0] > 1:
+            idx = idx.repeat(self.scale[0], axis=0)
+        if self.scale[1] > 1:
+            idx = idx.repeat(self.scale[1], axis=1)
+        return idx
+
+    def image(self, *fields, gap=4):
+        """Palette image of one field, or of several fields side by side separated by `gap` pixels."""
+        with phase('render'):
+            panels = [self.indices(f) for f in fields]
+            if len(panels) > 1:
+                spacer = np.full((panels[0].shape[0], gap), BACKGROUND, dtype=np.uint8)
+                panels = [p for panel in panels for p in (panel, spacer)][:-1]
+            idx = np.ascontiguousarray(np.hstack(panels))
+            image = Image.frombytes('P', (idx.shape[1], idx.shape[0]), idx.tobytes())
+            image.putpalette(self.palette)
+        return image
+
+    def rgb(self, field):
+        """(H, W, 3) uint8 RGB array of `field`."""
+        return self.lut[self.indices(field)]
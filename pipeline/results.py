@@ -0,0 +1,196 @@
+"""
+Compact on-disk storage for the frames of a run.
+
+A result is a directory::
+
+    meta.json                  grid, dt, store interval, parameters, fields
+    times.npy                  simulation time of every stored frame (float64)
+    <field>_00000.npy, ...     chunks of `chunk_frames` frames, shape (n, *frame_shape)
+
+Frames are written chunk by chunk while the solver runs, so memory stays
+bounded, and `load_result` memory-maps the chunks: re-rendering reads frames
+straight from disk without the solver.
+"""
+import json
+import os
+
+import numpy as np
+
+from pipeline.profiling import count, phase
+
+META_FILE = 'meta.json'
+TIMES_FILE = 'times.npy'
+
+
+def _chunk_file(field, index):
+    return f'{field}_{index:05d}.npy'
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+class ResultWriter:
+    """
+    Append frames of one or more named fields to a result directory.
+
+        with ResultWriter('run/', fields=('magnitude',), metadata={...}) as out:
+            for _ in solver.iter_steps(...):
+                out.append(solver.t, magnitude=solver.magnitude)
+
+    Fields are stored as `dtype` (float16 halves float32 and is plenty for
+    plotting); every `chunk_frames` frames are flushed to a new .npy chunk.
+    With `keep_frames` (whole chunks) a stopped run is continued: the first
+    `keep_frames` frames already in `path` are kept and new frames follow.
+    """
+
+    def __init__(self, path, fields, metadata=None, dtype='float16', chunk_frames=32, keep_frames=0):
+        self.path = path
+        self.fields = tuple(fields)
+        self.metadata = dict(metadata or {})
+        self.dtype = np.dtype(dtype)
+        self.chunk_frames = chunk_frames
+        self.times = []
+        self.frame_shape = None
+        self._buffer = None
+        self._fill = 0
+        self._n_chunks = 0
+        self._n_written = 0
+        os.makedirs(path, exist_ok=True)
+        if keep_frames:
+            self._keep(keep_frames)
+
+    def _keep(self, n):
+        with open(os.path.join(self.path, META_FILE)) as fp:
+            meta = json.load(fp)
+        if n % self.chunk_frames or meta['chunk_frames'] != self.chunk_frames or n > meta['n_frames']:
+            raise ValueError(f"Cannot keep {n} of the {meta['n_frames']} frames in {self.path} "
+                             f"(chunks of {meta['chunk_frames']}, expected {self.chunk_frames})")
+        self.frame_shape = tuple(meta['frame_shape'])
+        self.times = np.load(os.path.join(self.path, TIMES_FILE))[:n].tolist()
+        self._n_chunks = n // self.chunk_frames
+        self._n_written = n
+
+    @property
+    def n_frames(self):
+        return len(self.times)
+
+    def append(self, t, **frames):
+        """Store one frame of every field at simulation time `t`."""
+        if set(frames) != set(self.fields):
+            raise ValueError(f"Expected fields {self.fields}, got {tuple(frames)}")
+        with phase('store'):
+            if self._buffer is None:
+                self.frame_shape = np.shape(frames[self.fields[0]])
+                self._buffer = {f: np.empty((self.chunk_frames,) + self.frame_shape, dtype=self.dtype)
+                                for f in self.fields}
+            for f in self.fields:
+                self._buffer[f][self._fill] = frames[f]
+            self._fill += 1
+            self.times.append(float(t))
+            if self._fill == self.chunk_frames:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered frames as the next chunk and update the metadata."""
+        if self._fill:
+            for f in self.fields:
+                np.save(os.path.join(self.path, _chunk_file(f, self._n_chunks)), self._buffer[f][:self._fill])
+                count('bytes_written', self._buffer[f][:self._fill].nbytes)
+            self._n_chunks += 1
+            self._n_written += self._fill
+            self._fill = 0
+        # Only frames already on disk are listed, so a run stopped half-way still loads
+        np.save(os.path.join(self.path, TIMES_FILE), np.asarray(self.times[:self._n_written]))
+        meta = {
+            'fields': list(self.fields),
+            'dtype': self.dtype.name,
+            'frame_shape': list(self.frame_shape or ()),
+            'chunk_frames': self.chunk_frames,
+            'n_chunks': self._n_chunks,
+            'n_frames': self._n_written,
+            **self.metadata,
+        }
+        tmp = os.path.join(self.path, META_FILE + '.tmp')
+        with open(tmp, 'w') as fp:
+            json.dump(_jsonable(meta), fp, indent=2)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+    close = flush
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameSeries:
+    """
+    Read-only view of one stored field; `series[i]` is frame `i` as a
+    memory-mapped array (no copy), `len(series)` the number of frames.
+    """
+
+    def __init__(self, chunks, chunk_frames):
+        self._chunks = chunks
+        self.chunk_frames = chunk_frames
+
+    def __len__(self):
+        return sum(len(c) for c in self._chunks)
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(f"frame {i} out of range for {n} frames")
+        return self._chunks[i // self.chunk_frames][i % self.chunk_frames]
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def max(self):
+        """Largest value over all frames, computed chunk by chunk."""
+        return max(float(np.max(c)) for c in self._chunks)
+
+
+class SimulationResult:
+    """A stored run: `meta` dict, `times` array and one `FrameSeries` per field."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as fp:
+            self.meta = json.load(fp)
+        self.times = np.load(os.path.join(path, TIMES_FILE))
+        self._series = {}
+
+    @property
+    def fields(self):
+        return tuple(self.meta['fields'])
+
+    @property
+    def n_frames(self):
+        return self.meta['n_frames']
+
+    def __getitem__(self, field):
+        if field not in self.fields:
+            raise KeyError(field)
+        if field not in self._series:
+            chunks = [np.load(os.path.join(self.path, _chunk_file(field, k)), mmap_mode='r')
+                      for k in range(self.meta['n_chunks'])]
+            self._series[field] = FrameSeries(chunks, self.meta['chunk_frames'])
+        return self._series[field]
+
+
+def load_result(path):
+    """Open a result directory written by `ResultWriter` (frames are memory-mapped)."""
+    return SimulationResult(path)
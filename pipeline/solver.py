@@ -0,0 +1,910 @@
+"""
+Shared Burgers solvers used by every pipeline script.
+
+All 2D drivers (obstacle flows, arrow plot, city/levee flood) advance the same
+coupled system
+
+    u_t = -u u_x - v u_y + nu (u_xx + u_yy)
+    v_t = -u v_x - v v_y + nu (v_xx + v_yy)
+
+with first-order upwind advection, central-difference diffusion and an
+explicit Euler step (or implicit diffusion with `integrator='imex'`). Stencils
+wrap around the domain (periodic halo); edge conditions and the obstacle
+no-slip mask are applied on top of that after every step, exactly like the
+original scripts did. `Burgers1D` is the 1D river model with the same
+time-stepping API.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from pipeline.geometry import MaskIndices
+from pipeline.profiling import count, phase
+
+try:
+    from scipy.fft import dst as _scipy_dst
+except ImportError:
+    _scipy_dst = None
+
+
+# --- Grid ---
+class Grid2D:
+    """Uniform cell grid with `ny` rows (y axis) and `nx` columns (x axis)."""
+
+    def __init__(self, nx, ny, dx, dy=None):
+        self.nx = int(nx)
+        self.ny = int(ny)
+        self.dx = float(dx)
+        self.dy = float(dx if dy is None else dy)
+
+    @classmethod
+    def from_lengths(cls, length_x, length_y, nx, ny):
+        return cls(nx, ny, length_x / nx, length_y / ny)
+
+    @property
+    def shape(self):
+        return self.ny, self.nx
+
+    @property
+    def length_x(self):
+        return self.nx * self.dx
+
+    @property
+    def length_y(self):
+        return self.ny * self.dy
+
+    @property
+    def extent(self):
+        """`imshow` extent for plots with origin='lower'."""
+        return [0, self.length_x, 0, self.length_y]
+
+    def __repr__(self):
+        return f"Grid2D(nx={self.nx}, ny={self.ny}, dx={self.dx}, dy={self.dy})"
+
+
+# --- Boundary conditions ---
+# Index expressions for each domain edge. Row 0 is y=0 ('bottom' with origin='lower').
+# The leading Ellipsis keeps them valid for stacked (batched) fields as well.
+_EDGES = {
+    'bottom': (Ellipsis, 0, slice(None)),
+    'top': (Ellipsis, -1, slice(None)),
+    'left': (Ellipsis, slice(None), 0),
+    'right': (Ellipsis, slice(None), -1),
+}
+# First interior line next to each edge (source for zero-gradient conditions).
+_INNER = {
+    'bottom': (Ellipsis, 1, slice(None)),
+    'top': (Ellipsis, -2, slice(None)),
+    'left': (Ellipsis, slice(None), 1),
+    'right': (Ellipsis, slice(None), -2),
+}
+
+
+def _check_edge(edge):
+    if edge not in _EDGES:
+        raise ValueError(f"Unknown edge {edge!r}, expected one of {sorted(_EDGES)}")
+    return edge
+
+
+def _value_at(value, t):
+    return value(t) if callable(value) else value
+
+
+class Dirichlet:
+    """
+    Fixed value on one edge. `u` / `v` may be numbers or callables of time;
+    None leaves that component untouched.
+    """
+
+    def __init__(self, edge, u=None, v=None):
+        self.edge = _check_edge(edge)
+        self.u = u
+        self.v = v
+
+    def apply(self, u, v, t):
+        index = _EDGES[self.edge]
+        if self.u is not None:
+            u[index] = _value_at(self.u, t)
+        if self.v is not None:
+            v[index] = _value_at(self.v, t)
+
+
+class Neumann:
+    """Zero-gradient (free outflow) condition on one edge for the given fields."""
+
+    def __init__(self, edge, fields='uv'):
+        self.edge = _check_edge(edge)
+        self.fields = fields
+
+    def apply(self, u, v, t):
+        dst, src = _EDGES[self.edge], _INNER[self.edge]
+        if 'u' in self.fields:
+            u[dst] = u[src]
+        if 'v' in self.fields:
+            v[dst] = v[src]
+
+
+class PaddedOutflow:
+    """
+    Zero-gradient (free outflow) right end at a different point in every row
+    of a batched 1D field, for members of different lengths padded to a common
+    grid: row `b` ends at index `ends[b]`, and the padding beyond it copies the
+    end value so it never feeds anything back into the domain.
+    """
+
+    edge = 'right'
+
+    def __init__(self, ends, fields='u'):
+        self.ends = np.asarray(ends, dtype=int)
+        self.fields = fields
+        self._rows = np.arange(len(self.ends))
+        self._pad = None
+
+    def _apply(self, f):
+        if self._pad is None:
+            self._pad = np.arange(f.shape[-1]) > self.ends[:, None]
+        f[self._rows, self.ends] = f[self._rows, self.ends - 1]
+        np.copyto(f, f[self._rows, self.ends][:, None], where=self._pad)
+
+    def apply(self, u, v, t):
+        if 'u' in self.fields:
+            self._apply(u)
+        if 'v' in self.fields:
+            self._apply(v)
+
+
+def apply_boundary_conditions(bcs, u, v, t, mask=None):
+    """Apply edge conditions in order, then the obstacle no-slip mask."""
+    for bc in bcs:
+        bc.apply(u, v, t)
+    if mask is not None:
+        np.copyto(u, 0.0, where=mask)
+        np.copyto(v, 0.0, where=mask)
+
+
+# --- Stencil ---
+def upwind_advection(u, v, dx, dy):
+    """Advection terms -(u, v).grad(u) and -(u, v).grad(v), first-order upwind, periodic halo."""
+    u_xm, u_xp = np.roll(u, 1, axis=-1), np.roll(u, -1, axis=-1)
+    u_ym, u_yp = np.roll(u, 1, axis=-2), np.roll(u, -1, axis=-2)
+    v_xm, v_xp = np.roll(v, 1, axis=-1), np.roll(v, -1, axis=-1)
+    v_ym, v_yp = np.roll(v, 1, axis=-2), np.roll(v, -1, axis=-2)
+
+    u_adv_x = np.where(u > 0, (u - u_xm) / dx, (u_xp - u) / dx)
+    u_adv_y = np.where(v > 0, (u - u_ym) / dy, (u_yp - u) / dy)
+    v_adv_x = np.where(u > 0, (v - v_xm) / dx, (v_xp - v) / dx)
+    v_adv_y = np.where(v > 0, (v - v_ym) / dy, (v_yp - v) / dy)
+
+    return -u * u_adv_x - v * u_adv_y, -u * v_adv_x - v * v_adv_y
+
+
+def laplacian(f, dx, dy):
+    """5-point Laplacian with a periodic halo."""
+    f_xx = (np.roll(f, 1, axis=-1) - 2 * f + np.roll(f, -1, axis=-1)) / dx ** 2
+    f_yy = (np.roll(f, 1, axis=-2) - 2 * f + np.roll(f, -1, axis=-2)) / dy ** 2
+    return f_xx + f_yy
+
+
+def burgers_rhs(u, v, dx, dy, nu):
+    """Right-hand side of the 2D Burgers system (upwind advection, periodic halo)."""
+    adv_u, adv_v = upwind_advection(u, v, dx, dy)
+    return adv_u + nu * laplacian(u, dx, dy), adv_v + nu * laplacian(v, dx, dy)
+
+
+def second_difference_symbol(n, periodic):
+    """
+    Eigenvalues of the 1D second difference (times h**2) on `n` points:
+    periodic (FFT ordering) or with fixed values just outside (DST-I ordering).
+    """
+    if periodic:
+        return 2 * np.cos(2 * np.pi * np.fft.fftfreq(n)) - 2
+    return 2 * np.cos(np.pi * np.arange(1, n + 1) / (n + 1)) - 2
+
+
+def dst1(x, axis=-1):
+    """
+    Orthonormal type-I discrete sine transform along `axis`. It is its own
+    inverse. Uses scipy.fft when available, otherwise an FFT of the odd extension.
+    """
+    n = x.shape[axis]
+    if _scipy_dst is not None:
+        return _scipy_dst(x, type=1, axis=axis, norm='ortho')
+    x = np.moveaxis(x, axis, -1)
+    zero = np.zeros(x.shape[:-1] + (1,))
+    extended = np.concatenate([zero, x, zero, -x[..., ::-1]], axis=-1)
+    transformed = -np.fft.rfft(extended, axis=-1)[..., 1:n + 1].imag * np.sqrt(0.5 / (n + 1))
+    return np.moveaxis(transformed, -1, axis)
+
+
+# --- Kernels ---
+class RollKernel:
+    """
+    Reference kernel: `burgers_rhs` on plain arrays. Simple, but every step
+    allocates a few dozen temporaries of the full field size.
+    """
+    name = 'roll'
+    fuses_mask = False
+    implicit_diffusion = False
+
+    def __init__(self, shape, dx, dy, mask=None, fixed_edges=()):
+        self.dx, self.dy = dx, dy
+        self.u = np.zeros(shape)
+        self.v = np.zeros(shape)
+
+    def advance(self, nu, dt):
+        du, dv = burgers_rhs(self.u, self.v, self.dx, self.dy, nu)
+        self.u += dt * du
+        self.v += dt * dv
+
+
+_HaloViews = namedtuple('_HaloViews', 'u v u_nb v_nb du dv a b u_pos v_pos')
+
+
+class HaloKernel:
+    """
+    Allocation-free kernel. The fields live inside arrays padded with one ghost
+    cell on each side; `u`/`v` are views of the interior. Each step refreshes
+    the (periodic) halo and evaluates the stencil on shifted slice views into
+    preallocated scratch buffers with `out=` ufuncs, so nothing is allocated
+    after construction. `advance_rows` updates a band of rows only.
+    """
+    name = 'halo'
+    fuses_mask = False
+    implicit_diffusion = False
+
+    def __init__(self, shape, dx, dy, mask=None, fixed_edges=()):
+        self.dx, self.dy = dx, dy
+        padded = shape[:-2] + (shape[-2] + 2, shape[-1] + 2)
+        self._U = np.zeros(padded)
+        self._V = np.zeros(padded)
+        self.u = self._U[..., 1:-1, 1:-1]
+        self.v = self._V[..., 1:-1, 1:-1]
+        self._du = np.empty(shape)
+        self._dv = np.empty(shape)
+        self._a = np.empty(shape)
+        self._b = np.empty(shape)
+        self._u_pos = np.empty(shape, dtype=bool)
+        self._v_pos = np.empty(shape, dtype=bool)
+        self._full = self._views(0, shape[-2])
+        self._band, self._band_rows = self._full, (0, shape[-2])
+
+    def _views(self, lo, hi):
+        """Views of the fields, their neighbours (x-minus, x-plus, y-minus, y-plus) and scratch for rows lo:hi."""
+        rows = (Ellipsis, slice(lo, hi), slice(None))
+
+        def neighbours(P):
+            return (P[..., 1 + lo:1 + hi, :-2], P[..., 1 + lo:1 + hi, 2:],
+                    P[..., lo:hi, 1:-1], P[..., 2 + lo:2 + hi, 1:-1])
+
+        return _HaloViews(self.u[rows], self.v[rows], neighbours(self._U), neighbours(self._V),
+                          self._du[rows], self._dv[rows], self._a[rows], self._b[rows],
+                          self._u_pos[rows], self._v_pos[rows])
+
+    @staticmethod
+    def _fill_halo(P):
+        # Periodic ghost cells, matching np.roll in the reference kernel.
+        # Corners are never read by the 5-point stencil.
+        P[..., 0, 1:-1] = P[..., -2, 1:-1]
+        P[..., -1, 1:-1] = P[..., 1, 1:-1]
+        P[..., 1:-1, 0] = P[..., 1:-1, -2]
+        P[..., 1:-1, -1] = P[..., 1:-1, 1]
+
+    def _rhs(self, w, f, neighbours, out, nu):
+        a, b = w.a, w.b
+        f_xm, f_xp, f_ym, f_yp = neighbours
+        # diffusion
+        np.add(f_xm, f_xp, out=a)
+        a -= f
+        a -= f
+        np.multiply(a, nu / self.dx ** 2, out=out)
+        np.add(f_ym, f_yp, out=a)
+        a -= f
+        a -= f
+        a *= nu / self.dy ** 2
+        out += a
+        # upwind advection in x: backward difference where u > 0
+        np.subtract(f, f_xm, out=a)
+        np.subtract(f_xp, f, out=b)
+        np.copyto(b, a, where=w.u_pos)
+        b *= w.u
+        b *= 1.0 / self.dx
+        out -= b
+        # upwind advection in y: backward difference where v > 0
+        np.subtract(f, f_ym, out=a)
+        np.subtract(f_yp, f, out=b)
+        np.copyto(b, a, where=w.v_pos)
+        b *= w.v
+        b *= 1.0 / self.dy
+        out -= b
+
+    def _advance(self, w, nu, dt):
+        self._fill_halo(self._U)
+        self._fill_halo(self._V)
+        np.greater(w.u, 0, out=w.u_pos)
+        np.greater(w.v, 0, out=w.v_pos)
+        u, v, du, dv = w.u, w.v, w.du, w.dv
+        self._rhs(w, u, w.u_nb, du, nu)
+        self._rhs(w, v, w.v_nb, dv, nu)
+        du *= dt
+        dv *= dt
+        u += du
+        v += dv
+
+    def advance(self, nu, dt):
+        self._advance(self._full, nu, dt)
+
+    def advance_rows(self, nu, dt, lo, hi):
+        """Step rows `lo:hi` only; the others keep their values."""
+        if self._band_rows != (lo, hi):
+            self._band = self._views(lo, hi)
+            self._band_rows = (lo, hi)
+        self._advance(self._band, nu, dt)
+
+
+class ImexKernel:
+    """
+    IMEX step: explicit upwind advection and backward-Euler diffusion, solved
+    exactly with fast transforms, so only the advection (CFL) limit restricts
+    the step size.
+
+    The implicit solve is written for the increment, whose explicit part uses
+    the same 5-point Laplacian as the other kernels. Along an axis whose edges
+    carry conditions (`fixed_edges`) the edge lines are held fixed during the
+    solve (sine transform) and then set by the conditions; fully periodic axes
+    use the FFT.
+    """
+    name = 'imex'
+    fuses_mask = False
+    implicit_diffusion = True
+
+    def __init__(self, shape, dx, dy, mask=None, fixed_edges=()):
+        self.dx, self.dy = dx, dy
+        self.u = np.zeros(shape)
+        self.v = np.zeros(shape)
+        self._fixed_x = bool({'left', 'right'} & set(fixed_edges))
+        self._fixed_y = bool({'bottom', 'top'} & set(fixed_edges))
+        ny, nx = shape[-2:]
+        sy = second_difference_symbol(ny - 2 if self._fixed_y else ny, not self._fixed_y)
+        sx = second_difference_symbol(nx - 2 if self._fixed_x else nx, not self._fixed_x)
+        self._symbol = sy[:, None] / dy ** 2 + sx[None, :] / dx ** 2
+        self._region = (Ellipsis,
+                        slice(1, -1) if self._fixed_y else slice(None),
+                        slice(1, -1) if self._fixed_x else slice(None))
+        self._fft_axes = tuple(axis for axis, fixed in ((-2, self._fixed_y), (-1, self._fixed_x)) if not fixed)
+
+    def _solve(self, rhs, coefficient):
+        """(I - coefficient * Laplacian)^-1 rhs on the solved region."""
+        spectrum = rhs
+        if self._fixed_x:
+            spectrum = dst1(spectrum, axis=-1)
+        if self._fixed_y:
+            spectrum = dst1(spectrum, axis=-2)
+        if self._fft_axes:
+            spectrum = np.fft.fftn(spectrum, axes=self._fft_axes)
+        spectrum = spectrum / (1 - coefficient * self._symbol)
+        if self._fft_axes:
+            spectrum = np.fft.ifftn(spectrum, axes=self._fft_axes).real
+        if self._fixed_y:
+            spectrum = dst1(spectrum, axis=-2)
+        if self._fixed_x:
+            spectrum = dst1(spectrum, axis=-1)
+        return spectrum
+
+    def advance(self, nu, dt):
+        adv_u, adv_v = upwind_advection(self.u, self.v, self.dx, self.dy)
+        # Both components in one stacked solve
+        increment = np.stack([adv_u + nu * laplacian(self.u, self.dx, self.dy),
+                              adv_v + nu * laplacian(self.v, self.dx, self.dy)])
+        increment *= dt
+        correction = self._solve(increment[self._region], dt * nu)
+        self.u[self._region] += correction[0]
+        self.v[self._region] += correction[1]
+
+
+KERNELS = {kernel.name: kernel for kernel in (RollKernel, HaloKernel, ImexKernel)}
+
+try:
+    from pipeline.kernels_numba import NumbaKernel
+except ImportError:
+    NumbaKernel = None
+else:
+    KERNELS[NumbaKernel.name] = NumbaKernel
+
+
+def default_kernel():
+    """Fastest kernel available: the compiled one if numba is installed."""
+    return 'numba' if NumbaKernel is not None else 'halo'
+
+
+def _flat_index(field, cells):
+    """
+    `(flat, offsets)`: a 1D view of the contiguous array holding `field` and
+    the positions of `field[cells]` in it, so that `flat[offsets] = 0` is a
+    plain scatter even when `field` is a strided view (the halo kernel
+    interior). None if `field` is not backed by a contiguous array.
+    """
+    base = field
+    while isinstance(base.base, np.ndarray):
+        base = base.base
+    if not base.flags.c_contiguous:
+        return None
+    itemsize = field.itemsize
+    start = (field.__array_interface__['data'][0] - base.__array_interface__['data'][0]) // itemsize
+    offsets = start + sum(np.asarray(c, dtype=np.intp) * (stride // itemsize) for c, stride in zip(cells, field.strides))
+    return base.reshape(-1), offsets
+
+
+def _edge_cells(mask):
+    """Index of obstacle cells lying on the domain edges (None if there are none)."""
+    border = np.zeros_like(mask)
+    border[..., [0, -1], :] = mask[..., [0, -1], :]
+    border[..., :, [0, -1]] = mask[..., :, [0, -1]]
+    if not border.any():
+        return None
+    return (Ellipsis,) + np.nonzero(border)
+
+
+# --- Solvers ---
+INTEGRATORS = ('explicit', 'imex')
+
+
+class TimeStepper:
+    """
+    Time loop shared by the 1D and 2D solvers. Subclasses provide `step(dt)`
+    and `stable_dt(safety)` and keep `t` / `n_steps` up to date.
+    """
+    t = 0.0
+    n_steps = 0
+    #: attributes holding the evolving fields, copied by `checkpoint`
+    state_fields = ('u',)
+
+    def checkpoint(self):
+        """
+        Copy of the state as a dict of arrays: the `state_fields`, `t` and
+        `n_steps`. The solvers are deterministic, so a solver built with the
+        same parameters continues after `restore` exactly as this one does.
+        """
+        state = {name: np.array(getattr(self, name)) for name in self.state_fields}
+        state.update(t=np.float64(self.t), n_steps=np.int64(self.n_steps))
+        return state
+
+    def restore(self, state):
+        """Continue from a `checkpoint` of a solver with the same parameters."""
+        for name in self.state_fields:
+            field = getattr(self, name)
+            if field.shape != np.shape(state[name]):
+                raise ValueError(f"Checkpoint {name!r} has shape {np.shape(state[name])}, expected {field.shape}")
+            field[...] = state[name]
+        self.t = float(state['t'])
+        self.n_steps = int(state['n_steps'])
+
+    def iter_steps(self, n_steps, store_every=1, steady=None):
+        """
+        Generator advancing `n_steps` steps; yields the step index after every
+        `store_every`-th step (counted from the step about to be taken, as in
+        the original scripts). Read the fields from the solver when it yields.
+        With a `SteadyState` monitor `steady` the loop ends early once it
+        reports the flow settled.
+        """
+        for n in range(n_steps):
+            sample = steady.sample(self) if steady is not None and n % steady.check_every == 0 else None
+            with phase('step'):
+                self.step()
+            count('steps')
+            if sample is not None:
+                steady.check(self, sample, n)
+            if store_every and n % store_every == 0:
+                yield n
+            if steady is not None and steady.stop_step is not None and n >= steady.stop_step:
+                count('steps_saved', n_steps - n - 1)
+                return
+
+    def iter_until(self, frame_times, safety=0.9, dt_max=None):
+        """
+        Generator for adaptive stepping. Each step takes the largest stable dt
+        (see `stable_dt`, optionally capped at `dt_max`), shortened when needed
+        so that the solver lands exactly on every time in `frame_times`; yields
+        the frame index there.
+        """
+        for k, t_frame in enumerate(frame_times):
+            while t_frame - self.t > 1e-9 * max(1.0, abs(t_frame)):
+                dt = self.stable_dt(safety)
+                if dt_max is not None:
+                    dt = min(dt, dt_max)
+                with phase('step'):
+                    self.step(min(dt, t_frame - self.t))
+                count('steps')
+            yield k
+
+    def run(self, n_steps, store_every=None, on_store=None):
+        """Advance `n_steps` steps, calling `on_store(self, step)` as `iter_steps` yields."""
+        for n in self.iter_steps(n_steps, store_every if on_store is not None else 0):
+            on_store(self, n)
+        return self
+
+    def run_until(self, frame_times, on_frame=None, safety=0.9, dt_max=None):
+        """
+        Adaptive stepping through `frame_times` (see `iter_until`), calling
+        `on_frame(self, k)` at each of them. Returns the number of steps taken.
+        """
+        start = self.n_steps
+        for k in self.iter_until(frame_times, safety, dt_max):
+            if on_frame is not None:
+                on_frame(self, k)
+        return self.n_steps - start
+
+
+class SteadyState:
+    """
+    Detects when a 2D flow has settled, for `TimeStepper.iter_steps`.
+
+    Every `check_every` steps the step is measured on every `stride`-th cell
+    in both directions: the residual is the RMS of `(u_new - u, v_new - v) / dt`
+    over those cells (the largest over the members of a batch). Below `tol`
+    the flow is 'steady' and the run stops. Otherwise the sampled state is
+    compared with those of the last `history` checks; when it comes back to
+    within `period_tol` (relative to how far it moved in between) of one of
+    them, the flow is 'periodic' with that lag as `period` (in steps), and
+    the run stops one period later, so the last frames cover one period.
+    The states are compared through random projections to 16 numbers per
+    member, which keep their distances to within a few ten percent.
+
+    `state` ('steady', 'periodic' or None), `step` and `t` tell what was
+    detected where; `residual` is the last measured value.
+    """
+
+    def __init__(self, tol=1e-3, check_every=10, stride=4, period_tol=0.05, history=50):
+        self.tol = float(tol)
+        self.check_every = int(check_every)
+        self.period_tol = float(period_tol)
+        self._index = (Ellipsis, slice(None, None, stride), slice(None, None, stride))
+        self.history = int(history)
+        self._ring = self._basis = None
+        self._n_checks = 0
+        self.residual = None
+        self.state = self.step = self.t = self.period = None
+        self.stop_step = None
+
+    def sample(self, solver):
+        return np.stack([solver.u[self._index], solver.v[self._index]])
+
+    def check(self, solver, before, n):
+        """Measure step `n`, from the `sample` taken `before` it."""
+        if self.state is not None:
+            return
+        after = self.sample(solver)
+        change = after - before
+        self.residual = float(np.sqrt((change * change).sum(axis=0).mean(axis=(-2, -1))).max()) / solver.dt
+        if self.residual < self.tol:
+            self._detected('steady', solver, n, n)
+            return
+        # Distance to the state 1, 2, ... checks ago; a return close to an earlier state is a period
+        cells = after.shape[-2] * after.shape[-1]
+        members = np.moveaxis(after, 0, -3).reshape(-1, 2 * cells)
+        if self._basis is None:
+            self._basis = np.random.default_rng(0).standard_normal((members.shape[1], 16)) / np.sqrt(16 * cells)
+            self._ring = np.empty((self.history, len(members), 16))
+        fingerprint = members @ self._basis
+        lags = (self._n_checks - 1 - np.arange(min(self._n_checks, self.history))) % self.history
+        moved = np.sqrt(((self._ring[lags] - fingerprint) ** 2).sum(axis=-1)).max(axis=-1)
+        self._ring[self._n_checks % self.history] = fingerprint
+        self._n_checks += 1
+        farthest = np.maximum.accumulate(moved)
+        returns = np.flatnonzero(moved[1:] < self.period_tol * farthest[:-1])
+        if returns.size:
+            self.period = (returns[0] + 2) * self.check_every
+            self._detected('periodic', solver, n, n + self.period)
+
+    def _detected(self, state, solver, n, stop_step):
+        self.state, self.step, self.t, self.stop_step = state, n + 1, solver.t, stop_step
+
+    def summary(self):
+        if self.state == 'steady':
+            return f"Steady after {self.step} steps (t={self.t:.3g}, residual {self.residual:.2g})."
+        if self.state == 'periodic':
+            return f"Periodic from step {self.step} (t={self.t:.3g}) with a period of {self.period} steps."
+        residual = '-' if self.residual is None else f"{self.residual:.2g}"
+        return f"Not settled (residual {residual}, tolerance {self.tol:.2g})."
+
+
+def _check_integrator(integrator):
+    if integrator not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator {integrator!r}, expected one of {INTEGRATORS}")
+    return integrator
+
+
+def _finite_dt(dt, t):
+    if not np.isfinite(dt):
+        raise FloatingPointError(f"Solver state is not finite at t={t}")
+    return dt
+
+
+class Burgers2D(TimeStepper):
+    """
+    2D Burgers solver.
+
+    Parameters
+    ----------
+    grid : Grid2D
+    nu : float
+        Viscosity.
+    dt : float
+        Time step.
+    bcs : sequence of Dirichlet / Neumann
+        Edge conditions, applied in order after each step. Edges without a
+        condition stay periodic.
+    mask : bool array, optional
+        Obstacle cells, forced to zero velocity (no-slip) after each step.
+        Either `grid.shape`, or `(B,) + grid.shape` to stack one mask per
+        ensemble member.
+    u0, v0 : float or array, optional
+        Initial velocity components (default: at rest).
+    kernel : {'auto', 'numba', 'halo', 'roll'}
+        Stencil implementation for the explicit integrator. 'numba' runs one
+        fused, multi-threaded loop (needs numba); 'halo' updates the fields
+        in place without per-step allocations; 'roll' is the simple reference
+        version. 'auto' (default) picks 'numba' when available and 'halo'
+        otherwise.
+    batch : int, optional
+        Number of ensemble members advanced together. The fields then have
+        shape `(batch, ny, nx)`. Inferred from a stacked mask if not given.
+    integrator : {'explicit', 'imex'}
+        'imex' treats diffusion implicitly (FFT solve, see `ImexKernel`), which
+        removes the viscous limit `dx**2 / (4 * nu)` on the time step.
+    active_tiles : int, optional
+        Skip the fluid at rest: the rows are split into tiles of this many
+        rows, and only the band of tiles holding a velocity above `quiet_tol`
+        (plus one tile on each side) is stepped. The band is updated every
+        `active_tiles` steps; the explicit stencil spreads a disturbance by
+        one row per step, so the margin covers the steps in between and the
+        skipped cells differ from a full run by about `quiet_tol`. Rows with
+        a `Dirichlet` edge always stay in the band.
+        Needs the 'numba' or 'halo' kernel.
+    quiet_tol : float
+        Speed below which a cell counts as at rest for `active_tiles`.
+    """
+
+    state_fields = ('u', 'v')
+
+    def __init__(self, grid, nu, dt, bcs=(), mask=None, u0=0.0, v0=0.0, kernel='auto', batch=None,
+                 integrator='explicit', active_tiles=None, quiet_tol=1e-6):
+        if _check_integrator(integrator) == 'imex':
+            kernel = ImexKernel.name
+        elif kernel == 'auto':
+            kernel = default_kernel()
+        if kernel not in KERNELS:
+            raise ValueError(f"Unknown kernel {kernel!r}, expected one of {sorted(KERNELS)}")
+        self.grid = grid
+        self.nu = float(nu)
+        self.dt = float(dt)
+        self.bcs = list(bcs)
+        self.mask = None if mask is None else np.asarray(mask, dtype=bool)
+        if self.mask is not None:
+            if self.mask.shape[-2:] != grid.shape or self.mask.ndim not in (2, 3):
+                raise ValueError(f"Mask shape {self.mask.shape} does not match grid {grid.shape}")
+            if self.mask.ndim == 3:
+                if batch is not None and batch != self.mask.shape[0]:
+                    raise ValueError(f"Stacked mask has {self.mask.shape[0]} members, batch={batch}")
+                batch = self.mask.shape[0]
+        self.batch = batch
+        shape = grid.shape if batch is None else (batch,) + grid.shape
+        fixed_edges = {bc.edge for bc in self.bcs}
+        self.kernel = KERNELS[kernel](shape, grid.dx, grid.dy, self.mask, fixed_edges)
+        if active_tiles is not None and not hasattr(self.kernel, 'advance_rows'):
+            raise ValueError(f"Kernel {kernel!r} cannot step part of the grid, use 'numba' or 'halo'")
+        self.active_tiles = active_tiles
+        self.quiet_tol = float(quiet_tol)
+        self.active_rows = (0, grid.ny)
+        # Rows that always stay in the band: a fixed value may switch on at any step
+        set_edges = {bc.edge for bc in self.bcs if isinstance(bc, Dirichlet)}
+        self._pinned_rows = np.zeros(grid.ny, dtype=bool)
+        self._pinned_rows[0] = 'bottom' in set_edges
+        self._pinned_rows[-1] = 'top' in set_edges
+        # Without conditions on both y edges the stencil wraps around in y
+        self._periodic_y = not {'bottom', 'top'} <= fixed_edges
+        # A kernel that fuses the no-slip mask into its loop only needs it re-applied
+        # where an edge condition may have overwritten obstacle cells.
+        self._edge_obstacle = None
+        if self.kernel.fuses_mask and self.mask is not None and self.bcs:
+            self._edge_obstacle = _edge_cells(self.mask)
+        # Otherwise the obstacle cells are zeroed through precomputed flat indices,
+        # which only touches those cells instead of scanning the whole mask.
+        self.cells = None if self.mask is None else MaskIndices(np.broadcast_to(self.mask, shape))
+        self._no_slip = []
+        if self.cells is not None and not self.kernel.fuses_mask:
+            for field in (self.kernel.u, self.kernel.v):
+                flat = _flat_index(field, self.cells.obstacle)
+                self._no_slip.append((field.reshape(-1), self.cells.obstacle_flat) if flat is None else flat)
+        self.u[...] = u0
+        self.v[...] = v0
+        self.t = 0.0
+        self.n_steps = 0
+
+    @property
+    def u(self):
+        return self.kernel.u
+
+    @property
+    def v(self):
+        return self.kernel.v
+
+    @property
+    def shape(self):
+        return self.u.shape
+
+    @property
+    def magnitude(self):
+        return np.sqrt(self.u ** 2 + self.v ** 2)
+
+    def stable_dt(self, safety=0.9):
+        """
+        Largest stable step for the current state: the combined diffusion and
+        advection (CFL) limit of the upwind scheme, times `safety`. With
+        implicit diffusion only the advection limit applies.
+        """
+        g = self.grid
+        u_max = max(self.u.max(), -self.u.min())
+        v_max = max(self.v.max(), -self.v.min())
+        rate = u_max / g.dx + v_max / g.dy
+        if not self.kernel.implicit_diffusion:
+            rate += 2 * self.nu * (1 / g.dx ** 2 + 1 / g.dy ** 2)
+        return self.dt if rate == 0 else _finite_dt(safety / rate, self.t)
+
+    def _update_active_rows(self):
+        """Recompute `active_rows`, the `(lo, hi)` band of rows stepped by `active_tiles`."""
+        tile, ny = self.active_tiles, self.grid.ny
+        speed = np.maximum(np.abs(self.u), np.abs(self.v))
+        moving = speed.reshape(-1, ny, speed.shape[-1]).max(axis=(0, 2)) > self.quiet_tol
+        rows = np.flatnonzero(moving | self._pinned_rows)
+        if rows.size == 0:
+            self.active_rows = (0, 0)
+            return
+        lo = max(0, (int(rows[0]) // tile - 1) * tile)
+        hi = min(ny, (int(rows[-1]) // tile + 2) * tile)
+        if self._periodic_y and (lo == 0 or hi == ny):
+            lo, hi = 0, ny
+        self.active_rows = (lo, hi)
+
+    def checkpoint(self):
+        # The band is only recomputed every `active_tiles` steps, so it is part of the state
+        return dict(super().checkpoint(), active_rows=np.array(self.active_rows))
+
+    def restore(self, state):
+        super().restore(state)
+        self.active_rows = tuple(int(row) for row in state['active_rows'])
+
+    def step(self, dt=None):
+        """Advance the state by one time step (`self.dt` unless given)."""
+        dt = self.dt if dt is None else dt
+        if self.active_tiles is None:
+            self.kernel.advance(self.nu, dt)
+        else:
+            if self.n_steps % self.active_tiles == 0:
+                self._update_active_rows()
+            lo, hi = self.active_rows
+            if hi > lo:
+                self.kernel.advance_rows(self.nu, dt, lo, hi)
+            count('rows_skipped', self.grid.ny - (hi - lo))
+        with phase('boundary'):
+            if self.kernel.fuses_mask:
+                apply_boundary_conditions(self.bcs, self.u, self.v, self.t)
+                if self._edge_obstacle is not None:
+                    self.u[self._edge_obstacle] = 0
+                    self.v[self._edge_obstacle] = 0
+            else:
+                apply_boundary_conditions(self.bcs, self.u, self.v, self.t)
+                for flat, offsets in self._no_slip:
+                    flat[offsets] = 0.0
+        self.n_steps += 1
+        self.t += dt
+
+
+# --- 1D solver ---
+class Burgers1D(TimeStepper):
+    """
+    1D viscous Burgers solver, u_t + u u_x = nu u_xx, with central
+    differences on the interior points. The two end points are not updated by
+    the stencil; they are set by the edge conditions ('left' / 'right',
+    field 'u') after every step.
+
+    Parameters
+    ----------
+    nx : int
+        Number of grid points.
+    dx, nu, dt : float
+        Grid spacing, viscosity and default time step.
+    bcs : sequence of Dirichlet / Neumann / PaddedOutflow
+        Conditions on the 'left' and 'right' ends, applied in order.
+    u0 : float or array
+        Initial state.
+    integrator : {'explicit', 'imex'}
+        'imex' solves the diffusion implicitly with the end values held fixed
+        (exact sine-transform solve), which removes the `dx**2 / (2 * nu)`
+        limit on the time step.
+    batch : int, optional
+        Number of rivers advanced together in one array pass; `u` then has
+        shape `(batch, nx)`. Rows of different lengths share the grid of the
+        longest one, with a `PaddedOutflow` end per row.
+    """
+
+    def __init__(self, nx, dx, nu, dt, bcs=(), u0=0.0, integrator='explicit', batch=None):
+        self.integrator = _check_integrator(integrator)
+        self.nx = int(nx)
+        self.dx = float(dx)
+        self.nu = float(nu)
+        self.dt = float(dt)
+        self.bcs = list(bcs)
+        self.batch = batch
+        self._field = np.empty((1 if batch is None else batch, self.nx))
+        self._field[...] = u0
+        self._d2_symbol = second_difference_symbol(self.nx - 2, periodic=False)
+        # Second buffer and interior scratch for the allocation-free explicit step
+        self._next = self._field.copy()
+        self._tmp = np.empty(self._field[..., 1:-1].shape)
+        self.t = 0.0
+        self.n_steps = 0
+
+    @property
+    def u(self):
+        return self._field[0] if self.batch is None else self._field
+
+    @property
+    def x(self):
+        return np.arange(self.nx) * self.dx
+
+    def stable_dt(self, safety=0.9):
+        """
+        Largest stable step for the current state. Explicit: diffusion plus
+        advection limit. IMEX: advection CFL and the cell-Reynolds bound
+        `2 * nu / u**2` of forward-Euler central advection.
+        """
+        u_max = max(self._field.max(), -self._field.min())
+        if self.integrator == 'explicit':
+            rate = 2 * self.nu / self.dx ** 2 + u_max / self.dx
+        else:
+            rate = max(u_max / self.dx, u_max ** 2 / (2 * self.nu))
+        return self.dt if rate == 0 else _finite_dt(safety / rate, self.t)
+
+    def _explicit_step(self, dt):
+        """
+        Forward Euler with central differences into the second buffer, then
+        swap: u_i + r (u_{i+1} - 2 u_i + u_{i-1}) - c u_i (u_{i+1} - u_{i-1}),
+        regrouped so that no temporaries are allocated.
+        """
+        r = self.nu * dt / self.dx ** 2
+        c = dt / (2 * self.dx)
+        u, out, tmp = self._field, self._next, self._tmp
+        left, centre, right = u[..., :-2], u[..., 1:-1], u[..., 2:]
+        new = out[..., 1:-1]
+        np.subtract(right, left, out=tmp)
+        tmp *= centre
+        tmp *= c
+        np.multiply(centre, 1 - 2 * r, out=new)
+        new -= tmp
+        np.add(right, left, out=tmp)
+        tmp *= r
+        new += tmp
+        out[..., 0] = u[..., 0]
+        out[..., -1] = u[..., -1]
+        self._field, self._next = out, u
+
+    def step(self, dt=None):
+        """Advance the state by one time step (`self.dt` unless given)."""
+        dt = self.dt if dt is None else dt
+        if self.integrator == 'explicit':
+            self._explicit_step(dt)
+        else:
+            u = self._field
+            un = u.copy()
+            advection = un[..., 1:-1] * (un[..., 2:] - un[..., :-2]) / (2 * self.dx)
+            r = self.nu * dt / self.dx ** 2
+            rhs = un[..., 1:-1] - dt * advection
+            rhs[..., 0] += r * un[..., 0]
+            rhs[..., -1] += r * un[..., -1]
+            u[..., 1:-1] = dst1(dst1(rhs) / (1 - r * self._d2_symbol))
+        u = self._field
+        with phase('boundary'):
+            for bc in self.bcs:
+                bc.apply(u, None, self.t)
+        self.n_steps += 1
+        self.t += dt
@@ -0,0 +1,142 @@
+"""
+Streaming animation output.
+
+The solvers yield frames while they run (`iter_steps` / `iter_until`); the
+writers here encode each frame as soon as it is drawn, so memory use does not
+grow with the number of frames.
+"""
+import os
+
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+from pipeline.profiling import count, phase
+
+
+class GifStreamWriter:
+    """
+    Append frames to a looping GIF file one at a time. Every frame gets its
+    own 256-color palette. Use as a context manager or call `close()`.
+    """
+
+    def __init__(self, path, fps=15, loop=0):
+        self.path = path
+        self.duration = 1000 / fps
+        self.loop = loop
+        self.n_frames = 0
+        self._fp = None
+
+    def write(self, image):
+        """
+        Append one frame: a PIL image or an (H, W, 3|4) uint8 array. Palette
+        ("P") images, e.g. from `pipeline.render.HeatmapRenderer`, are written
+        as they are; anything else is quantized to 256 colors.
+        """
+        with phase('encode'):
+            if not isinstance(image, Image.Image):
+                image = Image.fromarray(np.asarray(image))
+            if image.mode == 'P':
+                frame = image
+            else:
+                frame = image.convert('RGB').quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            if self._fp is None:
+                self._fp = open(self.path, 'wb')
+                header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': self.duration})
+                self._fp.write(b''.join(header))
+            for chunk in GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True):
+                self._fp.write(chunk)
+        self.n_frames += 1
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.write(b';')  # GIF trailer
+            count('bytes_written', self._fp.tell())
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def figure_rgba(fig):
+    """Render a matplotlib figure and return its pixels as an (H, W, 4) uint8 array (no copy)."""
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())
+
+
+class FigureStream:
+    """
+    Encode successive states of a matplotlib figure straight to an animation
+    file. GIFs go through `GifStreamWriter`; other formats (e.g. .mp4) are
+    piped to ffmpeg through matplotlib's movie writer.
+
+        with FigureStream(fig, 'out.gif', fps=15, artists=[img, title]) as stream:
+            for frame in frames:
+                ...update artists...
+                stream.grab()
+
+    With `artists` (GIF output only) the figure is blitted: everything else
+    is drawn once as a background and only the listed artists are redrawn,
+    in the given order, on top of it for every frame. Artists that are
+    re-created every frame (e.g. a 3D surface) are passed to `grab` instead.
+    """
+
+    def __init__(self, fig, path, fps=15, dpi=None, artists=()):
+        self.fig = fig
+        self.path = path
+        self.fps = fps
+        self.dpi = dpi
+        self.artists = list(artists)
+        self.n_frames = 0
+        self._gif = None
+        self._saving = None
+        self._writer = None
+        self._background = None
+
+    def __enter__(self):
+        if os.path.splitext(self.path)[1].lower() == '.gif':
+            if self.dpi is not None:
+                self.fig.set_dpi(self.dpi)
+            self._gif = GifStreamWriter(self.path, fps=self.fps)
+        else:
+            from matplotlib.animation import FFMpegWriter
+            self._writer = FFMpegWriter(fps=self.fps)
+            self._saving = self._writer.saving(self.fig, self.path, self.dpi or self.fig.dpi)
+            self._saving.__enter__()
+        return self
+
+    def _blit_rgba(self):
+        canvas = self.fig.canvas
+        for artist in self.artists:
+            artist.set_animated(True)
+        if self._background is None:
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        canvas.restore_region(self._background)
+        for artist in self.artists:
+            if hasattr(artist, 'do_3d_projection'):
+                artist.do_3d_projection()  # done by Axes3D.draw in a full redraw
+            self.fig.draw_artist(artist)
+        return np.asarray(canvas.buffer_rgba())
+
+    def grab(self, artists=None):
+        """Encode the current state of the figure as the next frame (blitting `artists` if given)."""
+        if artists is not None:
+            self.artists = list(artists)
+        if self._gif is not None:
+            with phase('draw'):
+                rgba = self._blit_rgba() if self.artists else figure_rgba(self.fig)
+            self._gif.write(rgba)
+        else:
+            with phase('draw'):
+                self._writer.grab_frame()
+        self.n_frames += 1
+
+    def __exit__(self, *exc):
+        if self._gif is not None:
+            self._gif.close()
+        else:
+            self._saving.__exit__(*exc)
@@ -0,0 +1,228 @@
+"""
+Regenerate the station animations over a parameter grid in parallel.
+
+Every asset is one job (`kind` + parameters). Jobs whose output exists and
+whose content hash (parameters plus the source of the modules that produce
+it) matches the manifest are skipped; the rest run in a process pool, one
+single-threaded simulation per core. The manifest (`manifest.json` in the
+output directory) maps asset names to files and is read by the app.
+
+With `--cache` the simulations go through the result cache (see
+`pipeline.cache`), so assets rebuilt for a change in the drawing code only
+redraw stored runs; `--warm-cache` only fills the cache, without drawing.
+
+    python -m pipeline.sweep                      # everything shown in the app
+    python -m pipeline.sweep --kinds river --distance 10 20 30 40
+    python -m pipeline.sweep --warm-cache         # solver outputs only
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline import burgers_city_simulation_v2, obstacle_simulation_v2
+from pipeline.cache import CACHE_DIR, SOLVER_MODULES, ResultCache
+
+MANIFEST_FILE = 'manifest.json'
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules every simulation depends on; each kind adds its own driver
+CORE_MODULES = SOLVER_MODULES + ('streaming.py', 'render.py')
+
+
+def _river(params, path, frames_dir, cache):
+    from pipeline.burgers_city_simulation import simulate_burgers_with_city
+    simulate_burgers_with_city(d_distance_to_city=params['distance'], animation_file=path, cache=cache)
+
+
+def _warm_river(params, cache):
+    from pipeline.burgers_city_simulation import ANIMATION_FRAMES, run_river
+    cache.call(run_river, float(params['distance']), n_frames=ANIMATION_FRAMES)
+
+
+def _levees(params, path, frames_dir, cache):
+    from pipeline.burgers_city_simulation_v2 import simulate_2d_burgers_with_city_surface_plot
+    name = os.path.splitext(os.path.basename(path))[0]
+    simulate_2d_burgers_with_city_surface_plot(max_source_amplitude=params['amplitude'], animation_file=path,
+                                               result_dir=os.path.join(frames_dir, name), cache=cache)
+
+
+def _warm_levees(params, cache):
+    from pipeline.burgers_city_simulation_v2 import city_frames
+    for _ in city_frames(max_source_amplitude=params['amplitude'], cache=cache):
+        pass
+
+
+def _obstacles(params, path, frames_dir, cache):
+    from pipeline.obstacle_simulation_v2 import simulate_triple_obstacle_flow
+    simulate_triple_obstacle_flow(params['obstacle'], save_filename=path, cache=cache)
+
+
+def _warm_obstacles(params, cache):
+    from pipeline.obstacle_simulation_v2 import triple_frames
+    for _ in triple_frames([params['obstacle']], cache=cache)[2]:
+        pass
+
+
+# `warm` computes (or loads) exactly the solver output `run` draws, through the result cache;
+# `modules` start from the driver's `CACHE_MODULES`, so assets and cache entries go stale together
+Kind = namedtuple('Kind', 'run warm param defaults name modules cost')
+
+KINDS = {
+    'river': Kind(_river, _warm_river, 'distance', (10, 20, 30), 'burgers_simulation_with_source_{distance}',
+                  ('burgers_city_simulation.py',), cost=1),
+    'levees': Kind(_levees, _warm_levees, 'amplitude', (1.0, 1.5), 'burgers2d_with_levees_{amplitude}',
+                   burgers_city_simulation_v2.CACHE_MODULES + ('results.py',), cost=10),
+    'obstacles': Kind(_obstacles, _warm_obstacles, 'obstacle', ('circle', 'rectangle', 'square', 'triangle'),
+                      'flow_animation_triple_{obstacle}', obstacle_simulation_v2.CACHE_MODULES, cost=3),
+}
+
+
+def asset_name(kind, params):
+    """Name of the asset in the manifest, which is also the stem of its file."""
+    return KINDS[kind].name.format(**params)
+
+
+def job_hash(kind, params):
+    """Content hash of a job: its kind, parameters and the source of every module it runs."""
+    h = hashlib.sha256(json.dumps({'kind': kind, 'params': params}, sort_keys=True).encode())
+    for module in CORE_MODULES + KINDS[kind].modules:
+        with open(os.path.join(PIPELINE_DIR, module), 'rb') as fp:
+            h.update(fp.read())
+    return h.hexdigest()
+
+
+def build_jobs(kinds, grid):
+    """List of `(kind, params)` for the selected kinds; `grid` overrides the default values per parameter."""
+    jobs = []
+    for kind in kinds:
+        spec = KINDS[kind]
+        for value in grid.get(spec.param) or spec.defaults:
+            jobs.append((kind, {spec.param: value}))
+    return jobs
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'assets': {}}
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def save_manifest(manifest, output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _init_worker():
+    # One simulation per core: keep every worker single threaded and headless
+    import matplotlib
+    matplotlib.use('Agg')
+    try:
+        import numba
+        numba.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _run_job(kind, params, path, frames_dir, cache):
+    start = time.perf_counter()
+    KINDS[kind].run(params, path, frames_dir, cache)
+    return time.perf_counter() - start
+
+
+def _warm_job(kind, params, cache):
+    start = time.perf_counter()
+    KINDS[kind].warm(params, cache)
+    return time.perf_counter() - start
+
+
+def run_sweep(jobs, output_dir='data', frames_dir=os.path.join('build', 'frames'), max_workers=None,
+              force=False, dry_run=False, cache=None):
+    """
+    Run every job whose output is missing or out of date and record it in the
+    manifest; returns the names of the assets that were (or would be) built.
+    With a `ResultCache` `cache` the simulations are read from and stored in it.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    assets = manifest.setdefault('assets', {})
+
+    todo = []
+    for kind, params in jobs:
+        name = asset_name(kind, params)
+        digest = job_hash(kind, params)
+        entry = assets.get(name)
+        up_to_date = (entry is not None and entry.get('hash') == digest
+                      and os.path.exists(os.path.join(output_dir, entry['path'])))
+        if force or not up_to_date:
+            todo.append((kind, params, name, digest))
+    print(f"{len(jobs) - len(todo)} of {len(jobs)} assets up to date, {len(todo)} to build.")
+    if dry_run or not todo:
+        for _, _, name, _ in todo:
+            print(f"  would build {name}")
+        return [name for _, _, name, _ in todo]
+
+    # Longest jobs first so the pool is not left waiting on one straggler
+    todo.sort(key=lambda job: -KINDS[job[0]].cost)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(_run_job, kind, params, os.path.join(output_dir, name + '.gif'), frames_dir, cache):
+                   (kind, params, name, digest) for kind, params, name, digest in todo}
+        for future in as_completed(futures):
+            kind, params, name, digest = futures[future]
+            seconds = future.result()
+            assets[name] = {
+                'kind': kind,
+                'params': params,
+                'path': name + '.gif',
+                'hash': digest,
+                'seconds': round(seconds, 1),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            save_manifest(manifest, output_dir)
+            print(f"\nBuilt {name} in {seconds:.1f} s")
+    return [name for _, _, name, _ in todo]
+
+
+def warm_cache(jobs, cache, max_workers=None):
+    """Store the solver output of every job in the `ResultCache` `cache` (runs already stored are only read)."""
+    jobs = sorted(jobs, key=lambda job: -KINDS[job[0]].cost)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(_warm_job, kind, params, cache): asset_name(kind, params) for kind, params in jobs}
+        for future in as_completed(futures):
+            print(f"Cached {futures[future]} in {future.result():.1f} s")
+    entries = cache.entries()
+    print(f"{cache.path}: {len(entries)} entries, {sum(size for _, size, _ in entries) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Regenerate the station animations in parallel.")
+    parser.add_argument('--kinds', nargs='+', choices=tuple(KINDS), default=tuple(KINDS))
+    parser.add_argument('--distance', type=int, nargs='+', help="River distances to the city in km")
+    parser.add_argument('--amplitude', type=float, nargs='+', help="Levee run source amplitudes")
+    parser.add_argument('--obstacle', nargs='+', choices=KINDS['obstacles'].defaults)
+    parser.add_argument('--output-dir', default='data')
+    parser.add_argument('--frames-dir', default=os.path.join('build', 'frames'),
+                        help="Where the levee runs store their frames (see pipeline.results)")
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--force', action='store_true', help="Rebuild even if up to date")
+    parser.add_argument('--dry-run', action='store_true', help="Only list what would be built")
+    parser.add_argument('--cache', nargs='?', const=CACHE_DIR, metavar='DIR',
+                        help=f"Run the simulations through the result cache (default: {CACHE_DIR})")
+    parser.add_argument('--warm-cache', action='store_true',
+                        help="Only store the simulations in the result cache (no animations, implies --cache)")
+    args = parser.parse_args()
+    grid = {'distance': args.distance, 'amplitude': args.amplitude, 'obstacle': args.obstacle}
+    cache_dir = args.cache or (CACHE_DIR if args.warm_cache else None)
+    cache = None if cache_dir is None else ResultCache(cache_dir)
+    if args.warm_cache:
+        warm_cache(build_jobs(args.kinds, grid), cache, max_workers=args.jobs)
+    else:
+        run_sweep(build_jobs(args.kinds, grid), output_dir=args.output_dir, frames_dir=args.frames_dir,
+                  max_workers=args.jobs, force=args.force, dry_run=args.dry_run, cache=cache)
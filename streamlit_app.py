@@ -1,30 +1,227 @@
 import streamlit as st
-import base64
+import altair as alt
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from pipeline.burgers_city_simulation import run_river
+from pipeline.cache import ResultCache
+from pipeline.jobs import JobQueue
+from pipeline.vegetation import run_vegetation, vegetation_renderers
+
+DATA_DIR = "./data"
+ASSET_CACHE_BYTES = 64 * 1024 * 1024  # shared by all sessions
+LIVE_RUNS_KEPT = 128  # finished live runs shared by all sessions, a few hundred kB each
+RIVER_CHART_FRAMES = 60
+RIVER_CHART_POINTS = 200
+
+
+class AssetCache:
+    """
+    Contents of asset files, least recently used first out once the total
+    size exceeds `max_bytes`. Entries are keyed on path and modification
+    time, so a regenerated file is picked up on the next rerun.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        key = (path, os.stat(path).st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        with open(path, "rb") as fp:
+            contents = fp.read()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = contents
+                self.n_bytes += len(contents)
+                while self.n_bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.n_bytes -= len(evicted)
+        return contents
+
+
+@st.cache_resource
+def asset_cache():
+    return AssetCache(ASSET_CACHE_BYTES)
+
+
+@st.cache_data
+def _load_manifest(mtime_ns):
+    with open(os.path.join(DATA_DIR, "manifest.json")) as fp:
+        return json.load(fp)
+
+
+def manifest():
+    """Asset manifest written by `pipeline.sweep` / `pipeline.media` (empty if there is none)."""
+    manifest_path = os.path.join(DATA_DIR, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return {}
+    return _load_manifest(os.stat(manifest_path).st_mtime_ns)
+
+
+def asset_path(name):
+    """Path of a generated animation: from the manifest written by `python -m pipeline.sweep`,
+    or `data/<name>.gif` when the asset is not listed there."""
+    entry = manifest().get("assets", {}).get(name)
+    if entry is not None and os.path.exists(os.path.join(DATA_DIR, entry["path"])):
+        return os.path.join(DATA_DIR, entry["path"])
+    return os.path.join(DATA_DIR, name + ".gif")
+
+
+@st.cache_data
+def _file_digest(path, mtime_ns):
+    h = hashlib.sha1()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def client_width():
+    """Width to serve media at: small for phones (from the User-Agent), larger otherwise."""
+    context = getattr(st, "context", None)
+    user_agent = context.headers.get("User-Agent", "") if context is not None else ""
+    return 480 if "Mobi" in user_agent or "Android" in user_agent else 960
+
+
+def pick_variant(localImagePath, width):
+    """
+    Smallest variant (see `python -m pipeline.media`) at the largest width
+    not above `width`, as `(path, format)`; `(localImagePath, None)` when the
+    file has no up-to-date variants.
+    """
+    name = os.path.splitext(os.path.basename(localImagePath))[0]
+    entry = manifest().get("variants", {}).get(name)
+    if entry is None or entry["source_sha1"] != _file_digest(localImagePath, os.stat(localImagePath).st_mtime_ns):
+        return localImagePath, None
+    files = [f for f in entry["files"] if f["width"] <= width] or [min(entry["files"], key=lambda f: f["width"])]
+    widest = max(f["width"] for f in files)
+    best = min((f for f in files if f["width"] == widest), key=lambda f: f["bytes"])
+    path = os.path.join(DATA_DIR, best["path"])
+    return (path, best["format"]) if os.path.exists(path) else (localImagePath, None)
+
+
+def show_asset(localImagePath, caption=None, placeholder=st):
+    """
+    Show an image or animation, preferring the smallest WebP/MP4 variant that
+    fits the client and falling back to the original file. Streamlit serves
+    the file from its media endpoint under a content-hashed URL, so the page
+    only carries a link and the browser can cache the file across reruns.
+    """
+    path, fmt = pick_variant(localImagePath, client_width())
+    if fmt == "mp4":
+        box = placeholder.container()
+        box.video(path, loop=True, autoplay=True, muted=True)
+        if caption:
+            box.caption(caption)
+    elif fmt == "webp":
+        # By path: st.image re-encodes WebP bytes to a still PNG/JPEG
+        placeholder.image(path, caption=caption)
+    else:
+        placeholder.image(asset_cache().read(path), caption=caption)
+
+
+@st.cache_resource
+def result_cache():
+    """On-disk cache of the live runs, shared with other server processes and kept across restarts."""
+    return ResultCache()
+
+
+@st.cache_resource
+def job_queue():
+    """Process pool running the live simulations, shared by all sessions (see `pipeline.jobs`)."""
+    return JobQueue(finished_jobs=LIVE_RUNS_KEPT)
+
+
+def wait_for(job, text):
+    """Result of `job`, with a progress bar on the page while it runs."""
+    if not job.done():
+        bar = st.progress(job.progress, text=text)
+        while not job.done():
+            time.sleep(0.1)
+            bar.progress(job.progress, text=text)
+        bar.empty()
+    return job.result()
+
+
+def river_run(distance, amplitude, frequency):
+    """
+    Live 1D river run in the job queue, through the result cache. The
+    parameters are quantized (1 km, 0.05) first, so nearby slider positions
+    share a run, and sessions asking for the same run while it is computed
+    all wait for that one.
+    """
+    job = job_queue().submit(result_cache().call, run_river, float(round(distance)),
+                             source_amplitude=round(round(amplitude / 0.05) * 0.05, 2),
+                             source_frequency=round(round(frequency / 0.05) * 0.05, 2), n_frames=RIVER_CHART_FRAMES)
+    run = wait_for(job, "The flood wave is on its way...")
+    # Only the points the chart shows are sent to the browser
+    points = np.linspace(0, len(run.x) - 1, min(RIVER_CHART_POINTS, len(run.x))).round().astype(int)
+    return run._replace(x=run.x[points], frames=run.frames[:, points])
+
+
+def river_chart(run):
+    """
+    Wave profile with the city marked and a time slider. All frames go to the
+    browser once; moving the slider filters them there, without a rerun.
+    """
+    n_frames, n_points = run.frames.shape
+    data = pd.DataFrame({
+        "frame": np.repeat(np.arange(n_frames), n_points),
+        "km": np.tile(run.x, n_frames),
+        "height": run.frames.ravel(),
+    })
+    labels = pd.DataFrame({"frame": np.arange(n_frames),
+                           "label": [f"Time: {t:.1f} h, integrated height in city: {v:.3f}"
+                                     for t, v in zip(run.times, run.city_volume)]})
+    frame = alt.param(name="frame", value=0,
+                      bind=alt.binding_range(min=0, max=n_frames - 1, step=1, name="Time step "))
+    y_max = float(run.frames.max()) * 1.1
+    wave = alt.Chart(data).mark_line(color="blue").encode(
+        x=alt.X("km:Q", title="Distance (km)", scale=alt.Scale(domain=[0, float(run.x[-1])])),
+        y=alt.Y("height:Q", title="Wave Height (u)", scale=alt.Scale(domain=[0, y_max])),
+    ).transform_filter(alt.datum.frame == frame)
+    city = alt.Chart(pd.DataFrame({"km": run.city})).mark_rule(color="red", strokeDash=[6, 4], size=2).encode(x="km:Q")
+    label = alt.Chart(labels).mark_text(align="left", dx=5, dy=10).encode(
+        x=alt.value(0), y=alt.value(0), text="label:N",
+    ).transform_filter(alt.datum.frame == frame)
+    return (wave + city + label).add_params(frame).properties(height=400)
+
+
+def vegetation_run(rainfall):
+    """
+    Live station 4 run (about a third of a second) in the job queue, through
+    the result cache, per rainfall quantized to 0.05.
+    """
+    # Only the final fields and the mean curves are kept
+    job = job_queue().submit(result_cache().call, run_vegetation, round(round(rainfall / 0.05) * 0.05, 2), n_frames=1)
+    return wait_for(job, "Letting it rain...")
+
+
+def vegetation_history(run, points=100):
+    """Mean soil water and plant biomass over time, thinned to `points` rows for the chart."""
+    steps = np.linspace(0, len(run.mean_water) - 1, points).round().astype(int)
+    dt = run.times[-1] / len(run.mean_water)
+    return pd.DataFrame({"Soil water": run.mean_water[steps], "Plant biomass": run.mean_plants[steps]},
+                        index=pd.Index((steps + 1) * dt, name="Time"))
 
 
 def display_gif(placeholder, localImagePath, caption):
-    imgFile = open(localImagePath, "rb")
-    contents = imgFile.read()
-    imgData = base64.b64encode(contents).decode("utf-8")
-    imgFile.close()
-
-    # Define CSS styles for the container and caption
-    container_style = (
-        "position: relative;"  # Enable relative positioning
-        "display: inline-block;"  # Display as inline-block to align with placeholder
-    )
-
-    caption_style = (
-        "font-size: 14px;"  # Adjust the font size as needed
-        "color: #888888;"  # Dimmer color
-        "text-align: center;"  # Center the caption text
-    )
+    show_asset(localImagePath, caption, placeholder)
 
-    # Display the GIF and caption with positioning relative to the placeholder
-    placeholder.markdown(f"""<div style="{container_style}">
-                    <img src="data:image/gif;base64,{imgData}" width='1200' height='400'>
-                    <p style="{caption_style}">{caption}</p>
-                    </div>""", unsafe_allow_html=True)
 
 def _max_width_():
     max_width_str = f"max-width: 1400px;"
@@ -73,9 +270,17 @@ with c0:
                          )
             )
             if current_task == "1 station / First Drop / Brücke über die Mandau":
-                distance = st.select_slider(
-                    label="How far is the source of water from the city?",
-                    options=(10, 20, 30)
+                distance = st.slider(
+                    label="How far is the source of water from the city? [km]",
+                    min_value=5, max_value=50, value=20, step=1
+                )
+                amplitude = st.slider(
+                    label="How strong is the surge? [m/s]",
+                    min_value=0.1, max_value=1.0, value=0.3, step=0.05
+                )
+                frequency = st.slider(
+                    label="How often does it surge? [1/h]",
+                    min_value=0.1, max_value=1.5, value=0.8, step=0.05
                 )
                 question_1 = st.selectbox(
                     label="Q1: In how many countries does the Mandau river flow?",
@@ -90,7 +295,7 @@ with c0:
                         "The river changed course"
                     )
                 )
-                st.image("./data/station_1_img.png")
+                show_asset("./data/station_1_img.png")
 
             if current_task == "2 station / The Bleaching Fields / Mandau-Holzbrücke":
                 question_1 = st.selectbox(
@@ -111,7 +316,7 @@ with c0:
                         "Too much rain"
                     )
                 )
-                st.image("./data/station_2_img.png")
+                show_asset("./data/station_2_img.png")
             if current_task == "3 station / The Serpent’s Bend / German Name":
                 obstacle = st.selectbox(
                     "Select the obstacle type",
@@ -137,6 +342,10 @@ with c0:
                 )
 
             if current_task == "4 station / The Hidden Vein / German Name":
+                rainfall = st.slider(
+                    label="How much rain falls on the valley?",
+                    min_value=0.1, max_value=3.0, value=0.5, step=0.05
+                )
                 question_1 = st.selectbox(
                     label="Q1: What is the hidden part of the river mentioned here?",
                     options=(
@@ -231,17 +440,17 @@ if current_task == "1 station / First Drop / Brücke über die Mandau":
             )
 
         st.markdown("---")
-        st.image(f'./data/burgers_simulation_with_source_{distance}.gif')
+        st.altair_chart(river_chart(river_run(distance, amplitude, frequency)), use_container_width=True)
         st.markdown("---")
         e1, e2 = st.columns([2, 2])
         with e1:
             image_placeholder = st.empty()
-            imagePath = f"./data/burgers2d_with_levees_1.0.gif"
+            imagePath = asset_path("burgers2d_with_levees_1.0")
             display_gif(image_placeholder, imagePath,
                         "What if the river flow increases by 1.0 [m/s]?")
         with e2:
             image_placeholder = st.empty()
-            imagePath = f"./data/burgers2d_with_levees_1.5.gif"
+            imagePath = asset_path("burgers2d_with_levees_1.5")
             display_gif(image_placeholder, imagePath,
                         "What if the river flows increases by 1.5 [m/s]?")
         st.markdown("---")
@@ -381,7 +590,7 @@ if current_task == "3 station / The Serpent’s Bend / German Name":
         st.markdown("🧠 **Now it’s your turn.**")
 
         image_placeholder1 = st.empty()
-        imagePath1 = f"./data/flow_animation_triple_{obstacle}.gif"
+        imagePath1 = asset_path(f"flow_animation_triple_{obstacle}")
         display_gif(image_placeholder1, imagePath1,
                     "How can the flow change depending on the obstacles in the river?")
 
@@ -473,11 +682,14 @@ if current_task == "4 station / The Hidden Vein / German Name":
                 **Set the amount of rainfall** and see the effects on **water level** and **underground conditions**.
                 """
             )
+        run = vegetation_run(rainfall)
+        water, plants = vegetation_renderers()
         e1, e2 = st.columns([1, 1])
         with e1:
-            st.image("./data/vegetation_animation_u.gif")
+            st.image(water.image(run.water[-1]), caption=f"Water in the soil (rainfall {rainfall:.2f})")
         with e2:
-            st.image("./data/vegetation_animation_p.gif")
+            st.image(plants.image(run.plants[-1]), caption="Plant biomass")
+        st.line_chart(vegetation_history(run))
 
         st.markdown("---")
 
@@ -545,7 +757,7 @@ if current_task == "5 station / Final Checkpoint / German Name":
             """
         )
 
-        st.image("data/qr_code.png")
+        show_asset("data/qr_code.png")
 
         st.markdown(
             """